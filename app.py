@@ -1,211 +1,224 @@
-import pickle
+import time
+_import_start = time.perf_counter()
+import logging
 import streamlit as st
-import requests
 from requests.exceptions import ConnectTimeout, RequestException
-import time
-import json
 import os
-from datetime import datetime, timedelta
-import gdown
-import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import metrics
+from engine import Recommender, load_catalog, load_extras
+from metadata_cache import MetadataCache, MetadataStore
+from metadata import MetadataService, export_cache_metrics
+from omdb import ERROR_POSTER_URL, OMDB_API_KEY, OMDB_MAX_WORKERS, OMDBClient
+from posters import PosterStore
+from responses import ResponseCache
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+IMPORT_MS = (time.perf_counter() - _import_start) * 1000
+
+# Startup timings (imports, catalog, model, title index) are logged once per process
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+logger = logging.getLogger("app")
 
 # Configuration
-OMDB_API_KEY = os.environ.get("OMDB_API_KEY", "d13737da")  # Use environment variable
-OMDB_BASE_URL = "http://www.omdbapi.com/"
-
-# Cache system to reduce API calls
-class PosterCache:
-    def __init__(self, cache_duration_days=7):
-        self.cache_duration = timedelta(days=cache_duration_days)
-        # Use Streamlit's session state for caching instead of file system
-        if 'poster_cache' not in st.session_state:
-            st.session_state.poster_cache = {}
-    
-    def get(self, movie_title):
-        cache = st.session_state.poster_cache
-        if movie_title in cache:
-            cached_data = cache[movie_title]
-            # Check if cache is still valid
-            try:
-                cached_time = datetime.fromisoformat(cached_data['timestamp'])
-                if datetime.now() - cached_time < self.cache_duration:
-                    return cached_data['data']
-            except:
-                pass
+# Model type to serve ("neighbors", "ivf", "sparse", "dense" or "embedding"); empty picks the first one built
+RECOMMENDER_MODEL = os.environ.get("RECOMMENDER_MODEL")
+# Clusters scanned per query by the "ivf" model; empty keeps the value chosen at build time
+RECOMMENDER_NPROBE = os.environ.get("RECOMMENDER_NPROBE")
+SEARCH_RESULTS_LIMIT = 20  # Titles sent to the browser per search
+# Placeholders of cards whose lookup failed; responses holding one are not cached
+TIMEOUT_POSTER_URL = "https://via.placeholder.com/300x450?text=Connection+Timeout"
+UNEXPECTED_ERROR_POSTER_URL = "https://via.placeholder.com/300x450?text=Error"
+FAILED_POSTER_URLS = {TIMEOUT_POSTER_URL, ERROR_POSTER_URL, UNEXPECTED_ERROR_POSTER_URL}
+# Port of the Prometheus /metrics endpoint; empty disables it
+METRICS_PORT = os.environ.get("METRICS_PORT", "9108")
+# Interface of the /metrics endpoint; "0.0.0.0" exposes it beyond this machine
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+
+# Per-stage latency (recommend, load_data, OMDB cards) and errors by type
+STAGE_SECONDS = metrics.histogram("app_stage_seconds", "Latency of app stages", ("stage", "outcome"))
+APP_ERRORS = metrics.counter("app_errors_total", "Errors shown to users by stage and type", ("stage", "type"))
+
+@st.cache_resource
+def start_metrics_server():
+    """Serve /metrics once per process, next to the Streamlit server"""
+    if not METRICS_PORT:
         return None
-    
-    def set(self, movie_title, data):
-        st.session_state.poster_cache[movie_title] = {
-            'data': data,
-            'timestamp': datetime.now().isoformat()
-        }
+    try:
+        server = metrics.start_http_server(int(METRICS_PORT), METRICS_HOST)
+    except OSError as e:
+        logger.warning("Metrics endpoint not started on port %s: %s", METRICS_PORT, e)
+        return None
+    logger.info("Serving metrics on %s:%s", METRICS_HOST, METRICS_PORT)
+    return server
+
+start_metrics_server()
+
+# Cache system to reduce API calls, shared by every session in the process
+@st.cache_resource
+def get_poster_cache():
+    """Process-wide LRU cache of OMDB payloads with a 7-day TTL, backed by SQLite"""
+    return MetadataCache(cache_duration_days=7, store=MetadataStore())
 
 # Initialize cache
-poster_cache = PosterCache()
+poster_cache = get_poster_cache()
+export_cache_metrics(poster_cache)
 
-def fetch_poster_omdb(movie_title, year=None):
-    """Fetch movie poster from OMDB API with caching"""
-    
-    # Check cache first
-    cache_key = f"{movie_title}_{year}" if year else movie_title
-    cached_data = poster_cache.get(cache_key)
-    
-    if cached_data:
-        poster_url = cached_data.get('Poster', 'N/A')
-        if poster_url and poster_url != 'N/A':
-            return poster_url
-        else:
-            return "https://via.placeholder.com/300x450?text=No+Poster+Available"
-    
+@st.cache_resource
+def get_omdb_client():
+    """One pooled, rate-limited OMDB client shared by every session"""
+    return OMDBClient()
+
+@st.cache_resource
+def get_fetch_executor():
+    """Bounded thread pool that resolves recommendation cards in parallel"""
+    return ThreadPoolExecutor(max_workers=OMDB_MAX_WORKERS, thread_name_prefix="omdb")
+
+@st.cache_resource
+def get_poster_store():
+    """On-disk cache of resized poster thumbnails shared by every session"""
+    return PosterStore(max_connections=OMDB_MAX_WORKERS)
+
+def poster_image(url):
+    """Local thumbnail bytes for a poster URL, or the URL itself if it cannot be cached"""
+    return get_poster_store().thumbnail(url) or url
+
+@st.cache_resource
+def get_metadata_service():
+    """Cached OMDB lookups with background refresh of expired entries"""
+    return MetadataService(get_omdb_client(), poster_cache, executor=get_fetch_executor())
+
+@st.cache_resource
+def get_response_cache():
+    """Finished recommendation responses shared by every session, for the loaded model version"""
+    return ResponseCache()
+
+def get_movie_card_omdb(movie_title, year=None):
+    """Poster URL and details of a movie from one OMDB lookup"""
     try:
-        # Build the query parameters
-        params = {
-            'apikey': OMDB_API_KEY,
-            't': movie_title,  # Search by title
-            'type': 'movie'
-        }
-        
-        # Add year if available for more accurate results
-        if year:
-            params['y'] = year
-        
-        # Make the request
-        response = requests.get(OMDB_BASE_URL, params=params, timeout=10)
-        response.raise_for_status()
+        return get_metadata_service().card(movie_title, year)
         
-        data = response.json()
-        
-        # Cache the response
-        if data.get('Response') == 'True':
-            poster_cache.set(cache_key, data)
-            poster_url = data.get('Poster', 'N/A')
-            
-            if poster_url and poster_url != 'N/A':
-                return poster_url
-            else:
-                return "https://via.placeholder.com/300x450?text=No+Poster+Available"
-        else:
-            # Movie not found
-            return "https://via.placeholder.com/300x450?text=Movie+Not+Found"
-            
     except ConnectTimeout:
-        st.warning(f"Connection timeout while fetching poster for {movie_title}")
-        return "https://via.placeholder.com/300x450?text=Connection+Timeout"
+        APP_ERRORS.inc(stage="movie_card", type="ConnectTimeout")
+        st.warning(f"Connection timeout while fetching {movie_title}")
+        return TIMEOUT_POSTER_URL, None
         
     except RequestException as e:
-        st.error(f"Error fetching poster: {str(e)}")
-        return "https://via.placeholder.com/300x450?text=Error+Loading+Poster"
+        APP_ERRORS.inc(stage="movie_card", type=type(e).__name__)
+        st.error(f"Error fetching movie data: {str(e)}")
+        return ERROR_POSTER_URL, None
         
     except Exception as e:
+        APP_ERRORS.inc(stage="movie_card", type=type(e).__name__)
         st.error(f"Unexpected error: {str(e)}")
-        return "https://via.placeholder.com/300x450?text=Error"
+        return UNEXPECTED_ERROR_POSTER_URL, None
 
 def get_movie_details_omdb(movie_title, year=None):
     """Get additional movie details from OMDB with caching"""
-    
-    # Check cache first
-    cache_key = f"{movie_title}_{year}" if year else movie_title
-    cached_data = poster_cache.get(cache_key)
-    
-    if cached_data and cached_data.get('Response') == 'True':
-        return {
-            'title': cached_data.get('Title', movie_title),
-            'year': cached_data.get('Year', 'N/A'),
-            'rating': cached_data.get('imdbRating', 'N/A'),
-            'plot': cached_data.get('Plot', 'No plot available'),
-            'genre': cached_data.get('Genre', 'N/A'),
-            'director': cached_data.get('Director', 'N/A'),
-            'actors': cached_data.get('Actors', 'N/A'),
-            'poster': cached_data.get('Poster', 'N/A'),
-            'runtime': cached_data.get('Runtime', 'N/A'),
-            'awards': cached_data.get('Awards', 'N/A')
-        }
-    
-    try:
-        params = {
-            'apikey': OMDB_API_KEY,
-            't': movie_title,
-            'type': 'movie',
-            'plot': 'short'
-        }
-        
-        if year:
-            params['y'] = year
-        
-        response = requests.get(OMDB_BASE_URL, params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if data.get('Response') == 'True':
-            # Cache the response
-            poster_cache.set(cache_key, data)
-            
-            return {
-                'title': data.get('Title', movie_title),
-                'year': data.get('Year', 'N/A'),
-                'rating': data.get('imdbRating', 'N/A'),
-                'plot': data.get('Plot', 'No plot available'),
-                'genre': data.get('Genre', 'N/A'),
-                'director': data.get('Director', 'N/A'),
-                'actors': data.get('Actors', 'N/A'),
-                'poster': data.get('Poster', 'N/A'),
-                'runtime': data.get('Runtime', 'N/A'),
-                'awards': data.get('Awards', 'N/A')
-            }
-        else:
-            return None
-            
-    except Exception as e:
-        st.error(f"Error fetching movie details: {str(e)}")
-        return None
+    with metrics.timed(STAGE_SECONDS, stage="get_movie_details_omdb"):
+        return get_movie_card_omdb(movie_title, year)[1]
 
-def recommend(movie, movies, similarity):
-    """Generate movie recommendations"""
-    try:
-        index = movies[movies['title'] == movie].index[0]
-        distances = sorted(list(enumerate(similarity[index])), reverse=True, key=lambda x: x[1])
-        
-        recommended_movies = []
-        
-        # Create a progress bar
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        for idx, i in enumerate(distances[1:6]):
-            # Update progress
-            progress = (idx + 1) / 5
-            progress_bar.progress(progress)
-            status_text.text(f'Loading recommendation {idx + 1} of 5...')
-            
-            # Get movie title
-            movie_title = movies.iloc[i[0]].title
-            
-            # Small delay to avoid hitting rate limits
-            if idx > 0:
-                time.sleep(0.1)
-            
-            # Fetch poster and details from OMDB
-            poster_url = fetch_poster_omdb(movie_title)
-            movie_details = get_movie_details_omdb(movie_title)
-            
-            recommended_movies.append({
-                'title': movie_title,
-                'poster': poster_url,
-                'details': movie_details,
-                'similarity_score': distances[idx + 1][1]
-            })
-        
-        # Clear progress indicators
-        progress_bar.empty()
-        status_text.empty()
-        
+def recommend(movie, index=None, filters=None):
+    """Generate movie recommendations, optionally filtered (see engine.Attributes.mask)"""
+    filters = filters or {}
+    # Filters are part of the cache key; lists become hashable tuples
+    variant = tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                           for name, value in filters.items())) or None
+    with metrics.timed(STAGE_SECONDS, stage="recommend"):
+        # Popular titles are answered from the shared response cache
+        recommender = get_recommender()
+        if index is None and movie in recommender.title_index:
+            index = recommender.title_index.lookup(movie)
+        if index is None:
+            # Unknown title; _recommend reports the error
+            return _recommend(movie, index, filters)
+        # Keyed on the row, as duplicate titles are different movies
+        index = int(index)
+        responses = get_response_cache()
+        recommended_movies = responses.get(index, 5, recommender.version, variant)
+        if recommended_movies is None:
+            recommended_movies = _recommend(movie, index, filters)
+            if recommended_movies and not any(m['poster'] in FAILED_POSTER_URLS for m in recommended_movies):
+                responses.set(index, 5, recommender.version, recommended_movies, variant)
         return recommended_movies
+
+def _recommend(movie, index, filters):
+    try:
+        recommender = get_recommender()
+        with metrics.timed(STAGE_SECONDS, stage="recommend_rank"):
+            if index is None:
+                index = recommender.title_index.lookup(movie)
+            # Filters are masks over the catalog's attribute columns; no OMDB call is needed
+            allowed = recommender.allowed(**filters)
+            neighbor_ids, neighbor_scores = recommender.neighbors(index, 5, allowed=allowed)
+        return fetch_cards(neighbor_ids, neighbor_scores)
         
     except Exception as e:
+        APP_ERRORS.inc(stage="recommend", type=type(e).__name__)
         st.error(f"Error generating recommendations: {str(e)}")
         return []
 
+def recommend_profile(liked, disliked, filters=None):
+    """Recommendations for a watchlist of liked (weighted) and disliked movies, in one vectorized query"""
+    with metrics.timed(STAGE_SECONDS, stage="recommend_profile"):
+        try:
+            recommender = get_recommender()
+            with metrics.timed(STAGE_SECONDS, stage="recommend_profile_rank"):
+                indices, weights = recommender.profile_seeds(liked, disliked)
+                allowed = recommender.allowed(**(filters or {}))
+                neighbor_ids, neighbor_scores = recommender.profile_neighbors(indices, weights, 5, allowed=allowed)
+            return fetch_cards(neighbor_ids, neighbor_scores)
+        
+        except Exception as e:
+            APP_ERRORS.inc(stage="recommend_profile", type=type(e).__name__)
+            st.error(f"Error generating recommendations: {str(e)}")
+            return []
+
+def fetch_cards(neighbor_ids, neighbor_scores):
+    """Recommendation cards (title, poster, thumbnail, details, score) for ranked catalog rows"""
+    recommender = get_recommender()
+    
+    # Create a progress bar
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    
+    movie_titles = recommender.titles[neighbor_ids].tolist()
+        
+    # Worker threads need this run's context to use session state and st.* calls
+    ctx = get_script_run_ctx()
+    
+    def fetch_card(movie_title):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        # Fetch poster and details from a single OMDB lookup, then the poster thumbnail
+        with metrics.timed(STAGE_SECONDS, stage="movie_card"):
+            poster_url, movie_details = get_movie_card_omdb(movie_title)
+            return poster_url, poster_image(poster_url), movie_details
+    
+    # All cards resolve in parallel; the client's rate limiter paces the requests
+    executor = get_fetch_executor()
+    futures = [executor.submit(fetch_card, movie_title) for movie_title in movie_titles]
+    for done, _ in enumerate(as_completed(futures), 1):
+        # Update progress
+        progress_bar.progress(done / len(futures))
+        status_text.text(f'Loaded recommendation {done} of {len(futures)}...')
+    
+    recommended_movies = []
+    for movie_title, score, future in zip(movie_titles, neighbor_scores, futures):
+        poster_url, thumbnail, movie_details = future.result()
+        recommended_movies.append({
+            'title': movie_title,
+            'poster': poster_url,
+            'thumbnail': thumbnail,
+            'details': movie_details,
+            'similarity_score': float(score)
+        })
+    
+    # Clear progress indicators
+    progress_bar.empty()
+    status_text.empty()
+    
+    return recommended_movies
+
 # Function to download data files from Google Drive or other source
 @st.cache_resource
 def download_data_files():
@@ -231,23 +244,40 @@ def download_data_files():
     return movie_list_path, similarity_path
 
 # Load data with error handling
-@st.cache_data
+# cache_resource hands every session the same objects; cache_data would
+# deep-copy the model on each rerun and defeat the shared memory maps
+@st.cache_resource
 def load_data():
+    with metrics.timed(STAGE_SECONDS, stage="load_data"):
+        return _load_data()
+
+def _load_data():
     try:
         # Try to load from data directory first
         movie_list_path, similarity_path = download_data_files()
-        
-        if os.path.exists(movie_list_path) and os.path.exists(similarity_path):
-            movies = pickle.load(open(movie_list_path, 'rb'))
-            similarity = pickle.load(open(similarity_path, 'rb'))
-            return movies, similarity
-        else:
-            st.error("Required data files not found. Please upload movie_list.pkl and similarity.pkl to the data directory.")
-            st.stop()
+        data_dir = os.path.dirname(movie_list_path)
+        titles, ids, model = load_catalog(data_dir, RECOMMENDER_MODEL, RECOMMENDER_NPROBE)
+        # Model version, materialized rankings and filter columns, when built
+        return titles, ids, model, load_extras(data_dir, model, len(titles))
+    except FileNotFoundError:
+        st.error("Required data files not found. Please add the catalog (catalog_*.npy from `build.py catalog`, "
+                 "or movie_list.pkl) and a model (e.g. neighbor_ids.npy and neighbor_scores.npy) to the data directory.")
+        st.stop()
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
         st.stop()
 
+@st.cache_resource
+def get_recommender():
+    """Ranking engine over the loaded catalog, shared with the HTTP service code"""
+    titles, ids, model, extras = load_data()
+    start = time.perf_counter()
+    recommender = Recommender(titles, model, ids=ids, **extras)
+    # Responses cached for a previously loaded model are dropped
+    get_response_cache().bind(recommender.version)
+    logger.info("Startup: imports %.0f ms, title index %.0f ms", IMPORT_MS, (time.perf_counter() - start) * 1000)
+    return recommender
+
 # Streamlit UI
 st.set_page_config(page_title="Movie Recommender System", page_icon="🎬", layout="wide")
 
@@ -271,24 +301,76 @@ st.markdown("Powered by OMDB API")
 st.markdown("---")
 
 # Load the data
-movies, similarity = load_data()
+recommender = get_recommender()
 
 # Main content area
 col1, col2 = st.columns([2, 1])
 
+title_index = recommender.title_index
+
 with col1:
-    # Movie selection
-    movie_list = movies['title'].values
-    selected_movie = st.selectbox(
-        "🔍 Type or select a movie from the dropdown",
-        movie_list,
+    # Movie search runs server-side so only the top matches reach the browser
+    search_query = st.text_input(
+        "🔍 Search for a movie",
+        placeholder="Start typing a title...",
+        help="Type part of a title, then pick a match below"
+    )
+    matches = title_index.search(search_query, limit=SEARCH_RESULTS_LIMIT)
+    if not matches:
+        st.warning(f"No movies match '{search_query}'")
+        matches = title_index.search("", limit=SEARCH_RESULTS_LIMIT)
+    
+    selected_index = st.selectbox(
+        "🎬 Select a movie",
+        matches,
+        format_func=title_index.label,
         help="Select a movie to get recommendations"
     )
+    selected_movie = title_index.titles[selected_index]
 
 with col2:
     st.write("")
     st.write("")
     show_details = st.checkbox("Show selected movie details", value=True)
+    # Watchlist of the session: liked titles with weights, disliked titles
+    st.session_state.setdefault('liked', {})
+    st.session_state.setdefault('disliked', {})
+    # Latest recommendations, kept across reruns for the export below
+    st.session_state.setdefault('last_recommendations', None)
+    like_col, dislike_col = st.columns(2)
+    with like_col:
+        if st.button("👍 Like", help="Add the selected movie to your watchlist"):
+            st.session_state.disliked.pop(selected_movie, None)
+            st.session_state.liked.setdefault(selected_movie, 1.0)
+    with dislike_col:
+        if st.button("👎 Dislike", help="Steer watchlist recommendations away from the selected movie"):
+            st.session_state.liked.pop(selected_movie, None)
+            st.session_state.disliked[selected_movie] = 1.0
+
+# Optional filters, evaluated on the attribute columns built by `build.py attributes`
+filters = {}
+attributes = recommender.attributes
+if attributes is not None:
+    with st.expander("🎚️ Filter recommendations"):
+        known_years = attributes.year[attributes.year > 0]
+        first_year, last_year = (int(known_years.min()), int(known_years.max())) if len(known_years) else (1900, 2030)
+        filter_col1, filter_col2 = st.columns(2)
+        with filter_col1:
+            genres = st.multiselect("Genres (all of)", attributes.genre_names)
+            min_rating = st.slider("Minimum rating", 0.0, 10.0, 0.0, step=0.5)
+        with filter_col2:
+            years = st.slider("Release year", first_year, max(last_year, first_year + 1), (first_year, last_year))
+            max_runtime = st.slider("Maximum runtime (min)", 60, 240, 240, step=10)
+        if genres:
+            filters['genres'] = genres
+        if min_rating > 0:
+            filters['min_rating'] = min_rating
+        if years[0] > first_year:
+            filters['min_year'] = years[0]
+        if years[1] < last_year:
+            filters['max_year'] = years[1]
+        if max_runtime < 240:
+            filters['max_runtime'] = max_runtime
 
 # Show selected movie details
 if show_details:
@@ -299,9 +381,9 @@ if show_details:
                 col1, col2 = st.columns([1, 3])
                 with col1:
                     if selected_details['poster'] != 'N/A':
-                        st.image(selected_details['poster'], width=200)
+                        st.image(poster_image(selected_details['poster']), width=200)
                     else:
-                        st.image("https://via.placeholder.com/200x300?text=No+Poster", width=200)
+                        st.image(poster_image("https://via.placeholder.com/200x300?text=No+Poster"), width=200)
                 with col2:
                     st.subheader(selected_details['title'])
                     col_a, col_b, col_c = st.columns(3)
@@ -321,43 +403,83 @@ if show_details:
 
 st.markdown("---")
 
+def show_recommendations(recommended_movies, intro):
+    """Recommendation cards in a row of five columns"""
+    st.markdown("### 🎬 Recommended Movies")
+    st.markdown(intro)
+    
+    # Display recommendations in columns
+    cols = st.columns(5)
+    
+    for idx, movie in enumerate(recommended_movies):
+        with cols[idx]:
+            # Movie poster
+            st.image(movie['thumbnail'], use_container_width=True)
+            
+            # Movie title
+            st.markdown(f"**{movie['title']}**")
+            
+            # Similarity score, clipped because disliked titles can push profile scores below 0
+            st.progress(min(max(movie['similarity_score'], 0.0), 1.0))
+            st.caption(f"Match: {movie['similarity_score']:.1%}")
+            
+            # Show additional details if available
+            if movie['details']:
+                st.caption(f"⭐ {movie['details']['rating']}/10")
+                st.caption(f"📅 {movie['details']['year']}")
+                
+                # Expandable section for more details
+                with st.expander("More info"):
+                    st.write(f"**Genre:** {movie['details']['genre']}")
+                    st.write(f"**Director:** {movie['details']['director']}")
+                    st.write(f"**Plot:** {movie['details']['plot']}")
+
 # Recommendation button
 if st.button('🎯 Get Movie Recommendations', type='primary'):
     with st.spinner('Finding similar movies...'):
-        recommended_movies = recommend(selected_movie, movies, similarity)
+        recommended_movies = recommend(selected_movie, index=selected_index, filters=filters)
     
     if recommended_movies:
-        st.markdown("### 🎬 Recommended Movies")
-        st.markdown("Based on your selection, you might also enjoy these movies:")
-        
-        # Display recommendations in columns
-        cols = st.columns(5)
-        
-        for idx, movie in enumerate(recommended_movies):
-            with cols[idx]:
-                # Movie poster
-                st.image(movie['poster'], use_container_width=True)
-                
-                # Movie title
-                st.markdown(f"**{movie['title']}**")
-                
-                # Similarity score
-                st.progress(movie['similarity_score'])
-                st.caption(f"Match: {movie['similarity_score']:.1%}")
-                
-                # Show additional details if available
-                if movie['details']:
-                    st.caption(f"⭐ {movie['details']['rating']}/10")
-                    st.caption(f"📅 {movie['details']['year']}")
-                    
-                    # Expandable section for more details
-                    with st.expander("More info"):
-                        st.write(f"**Genre:** {movie['details']['genre']}")
-                        st.write(f"**Director:** {movie['details']['director']}")
-                        st.write(f"**Plot:** {movie['details']['plot']}")
+        st.session_state.last_recommendations = (selected_movie, recommended_movies)
+        show_recommendations(recommended_movies, "Based on your selection, you might also enjoy these movies:")
+    elif filters:
+        st.warning("No similar movies match these filters. Try loosening them.")
     else:
         st.error("Unable to generate recommendations. Please try again.")
 
+# Watchlist recommendations, from every liked and disliked movie at once
+if st.session_state.liked or st.session_state.disliked:
+    st.markdown("---")
+    st.markdown("### ❤️ Your Watchlist")
+    for title in list(st.session_state.liked):
+        weight_col, remove_col = st.columns([4, 1])
+        with weight_col:
+            st.session_state.liked[title] = st.slider(f"👍 {title}", 0.5, 3.0, st.session_state.liked[title],
+                                                      step=0.5, key=f"weight_{title}", help="How much it counts")
+        with remove_col:
+            if st.button("Remove", key=f"remove_{title}"):
+                del st.session_state.liked[title]
+                st.rerun()
+    if st.session_state.disliked:
+        st.caption("👎 " + ", ".join(st.session_state.disliked))
+    
+    watch_col, clear_col = st.columns([3, 1])
+    with clear_col:
+        if st.button("Clear watchlist"):
+            st.session_state.liked.clear()
+            st.session_state.disliked.clear()
+            st.rerun()
+    with watch_col:
+        recommend_watchlist = st.button("🎯 Recommend from my watchlist", disabled=not st.session_state.liked)
+    if recommend_watchlist:
+        with st.spinner('Finding movies for your taste...'):
+            recommended_movies = recommend_profile(st.session_state.liked, st.session_state.disliked, filters)
+        if recommended_movies:
+            st.session_state.last_recommendations = ("your watchlist", recommended_movies)
+            show_recommendations(recommended_movies, "Based on your watchlist, you might also enjoy these movies:")
+        elif filters:
+            st.warning("No movies match these filters. Try loosening them.")
+
 # Sidebar with API status and settings
 with st.sidebar:
     st.header("📊 API Status")
@@ -367,11 +489,10 @@ with st.sidebar:
         with st.spinner("Testing connection..."):
             try:
                 test_params = {
-                    'apikey': OMDB_API_KEY,
                     't': 'Inception',
                     'type': 'movie'
                 }
-                response = requests.get(OMDB_BASE_URL, params=test_params, timeout=5)
+                response = get_omdb_client().get(test_params, timeout=5)
                 data = response.json()
                 
                 if response.status_code == 200 and data.get('Response') == 'True':
@@ -392,11 +513,30 @@ with st.sidebar:
     
     # Cache statistics
     st.header("💾 Cache Statistics")
-    if 'poster_cache' in st.session_state:
-        st.metric("Cached Movies", len(st.session_state.poster_cache))
+    cache_stats = poster_cache.stats()
+    if cache_stats['hits'] or cache_stats['misses'] or cache_stats['entries']:
+        col_a, col_b = st.columns(2)
+        with col_a:
+            st.metric("Cached Movies", cache_stats['entries'])
+            st.metric("Hits", cache_stats['hits'])
+            st.metric("Evictions", cache_stats['evictions'])
+        with col_b:
+            st.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+            st.metric("Misses", cache_stats['misses'])
+            st.metric("Size", f"{cache_stats['bytes'] / 1024:.0f} KB")
+        st.caption(f"Shared by all sessions on this server; {len(poster_cache.store)} movies stored on disk, "
+                   f"{cache_stats['stale_hits']} stale hits refreshed in the background")
+        poster_stats = get_poster_store().stats()
+        st.caption(f"Poster thumbnails: {poster_stats['bytes'] / 1024:.0f} KB on disk, "
+                   f"{poster_stats['hits']} hits, {poster_stats['misses']} downloads")
+        response_stats = get_response_cache().stats()
+        st.caption(f"Recommendations: {response_stats['entries']} cached, "
+                   f"{response_stats['hit_rate']:.0%} served without ranking or OMDB calls")
         
         if st.button("Clear Cache"):
-            st.session_state.poster_cache = {}
+            poster_cache.clear()
+            get_poster_store().clear()
+            get_response_cache().clear()
             st.success("Cache cleared!")
             st.rerun()
     else:
@@ -425,11 +565,12 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# Optional: Add batch download feature
+# Optional: Add batch download feature (`python export.py` dumps the whole catalog)
 if st.checkbox("📥 Export Recommendations"):
-    if 'recommended_movies' in locals() and recommended_movies:
+    if st.session_state.last_recommendations:
+        seed, recommended_movies = st.session_state.last_recommendations
         # Create a text summary
-        summary = f"Movie Recommendations for: {selected_movie}\n\n"
+        summary = f"Movie Recommendations for: {seed}\n\n"
         for i, movie in enumerate(recommended_movies, 1):
             summary += f"{i}. {movie['title']}"
             if movie['details']:
@@ -444,6 +585,6 @@ if st.checkbox("📥 Export Recommendations"):
         st.download_button(
             label="Download Recommendations as Text",
             data=summary,
-            file_name=f"recommendations_for_{selected_movie.replace(' ', '_')}.txt",
+            file_name=f"recommendations_for_{seed.replace(' ', '_')}.txt",
             mime="text/plain"
         )
\ No newline at end of file
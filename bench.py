@@ -0,0 +1,315 @@
+"""Offline benchmarks for the ranking, loading and metadata paths
+
+Generates synthetic catalogs (sparse tag vectors with a Zipf-like word
+distribution), builds every model type on them, and measures each one in
+a fresh process:
+
+- load time of the catalog, model and title index (``Recommender.load``)
+- peak RSS of the serving process
+- p50/p99 latency of single ``recommend()`` calls
+- throughput of batched ``recommend_many()`` calls
+- agreement with the notebook's ``sorted(enumerate(...))`` ranking
+  (exact models must match it; the IVF and embedding models report their
+  recall)
+
+It also times cached OMDB metadata lookups against a fake client. Nothing
+touches the network. Results are written as JSON, tagged with the git
+commit, so runs can be compared across commits.
+
+Usage:
+    python bench.py
+    python bench.py --sizes 5000 50000 500000 --output bench_results/main.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from engine import (DenseSimilarity, EmbeddingModel, IVFIndex, NeighborIndex, Recommender, SparseSimilarity,
+                    recall_at_k, save_catalog)
+
+SIZES = (5000, 50000, 500000)
+BACKENDS = ('neighbors', 'ivf', 'sparse', 'dense', 'embedding')
+WORK_DIR = os.path.join(tempfile.gettempdir(), "movie-recommender-bench")
+RESULTS_DIR = "bench_results"
+
+VOCABULARY_SIZE = 5000
+WORDS_PER_MOVIE = 40
+K = 5
+
+# Above these sizes the dense matrix does not fit in memory, and the exact
+# neighbor build takes too long; the neighbor table is then built from the
+# IVF index and checked for recall instead of equality
+MAX_DENSE = 10000
+MAX_EXACT_BUILD = 50000
+
+
+def synthetic_vectors(n, seed=0):
+    """L2-normalized float32 tag vectors, with word frequencies following a Zipf-like law"""
+    from scipy import sparse
+    from sklearn.preprocessing import normalize
+
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, VOCABULARY_SIZE + 1)
+    words = rng.choice(VOCABULARY_SIZE, size=(n, WORDS_PER_MOVIE), p=weights / weights.sum())
+    rows = np.repeat(np.arange(n), WORDS_PER_MOVIE)
+    counts = sparse.csr_matrix((np.ones(rows.size, dtype=np.float32), (rows, words.ravel())),
+                               shape=(n, VOCABULARY_SIZE))
+    counts.sum_duplicates()
+    return normalize(counts, norm='l2').astype(np.float32)
+
+
+def build_catalog(data_dir, n, backends, seed=0):
+    """Write a synthetic catalog and the requested models; returns build times in seconds"""
+    os.makedirs(data_dir, exist_ok=True)
+    timings = {}
+    start = time.perf_counter()
+    vectors = synthetic_vectors(n, seed)
+    vocabulary = [f"word{i}" for i in range(VOCABULARY_SIZE)]
+    save_catalog(data_dir, [f"Synthetic Movie {i}" for i in range(n)], np.arange(n) + 1)
+    model = SparseSimilarity(vectors, vocabulary)
+    model.save(data_dir)
+    timings['sparse'] = time.perf_counter() - start
+
+    ivf = None
+    if 'ivf' in backends or ('neighbors' in backends and n > MAX_EXACT_BUILD):
+        start = time.perf_counter()
+        ivf = IVFIndex.build(vectors)
+        ivf.save(data_dir)
+        timings['ivf'] = time.perf_counter() - start
+
+    if 'neighbors' in backends:
+        start = time.perf_counter()
+        if n <= MAX_EXACT_BUILD:
+            index = NeighborIndex.from_features(vectors)
+        else:
+            ids, scores = ivf.neighbors_many(np.arange(n), K)
+            index = NeighborIndex(ids, scores)
+        index.save(data_dir)
+        timings['neighbors'] = time.perf_counter() - start
+
+    if 'dense' in backends and n <= MAX_DENSE:
+        start = time.perf_counter()
+        # Same product as the sparse model, so every row is bit-identical to it
+        DenseSimilarity(np.asarray((vectors @ vectors.toarray().T).T, dtype=np.float32)).save(data_dir)
+        timings['dense'] = time.perf_counter() - start
+
+    if 'embedding' in backends:
+        start = time.perf_counter()
+        EmbeddingModel.build(vectors).save(data_dir)
+        timings['embedding'] = time.perf_counter() - start
+    return timings
+
+
+def reference_ranking(vectors, index, k=K):
+    """Top-k of one movie the way the notebook ranks them"""
+    row = vectors @ vectors[index].toarray().astype(np.float32)[0]
+    distances = sorted(list(enumerate(row)), reverse=True, key=lambda x: x[1])
+    return [i for i, _ in distances if i != index][:k]
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return {'p50_ms': float(np.percentile(samples, 50)), 'p99_ms': float(np.percentile(samples, 99)),
+            'mean_ms': float(samples.mean())}
+
+
+def peak_rss_mb():
+    # VmHWM is reset by exec; ru_maxrss is not on Linux, so it would carry the
+    # peak of the parent process over to each measuring process
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def measure(data_dir, backend, queries=1000, batch_size=1000, check_queries=50, seed=1):
+    """Benchmark one backend; meant to run in its own process so RSS is not shared"""
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    recommender = Recommender.load(data_dir, backend)
+    load_s = time.perf_counter() - start
+    n = len(recommender)
+
+    rng = np.random.default_rng(seed)
+    titles = recommender.titles[rng.integers(0, n, queries)]
+    latencies = []
+    for title in titles:
+        start = time.perf_counter()
+        recommender.recommend(title, K)
+        latencies.append(time.perf_counter() - start)
+
+    batch = recommender.titles[rng.integers(0, n, batch_size)]
+    rounds = 0
+    start = time.perf_counter()
+    while rounds < 3 or time.perf_counter() - start < 1.0:
+        recommender.recommend_many(batch, K)
+        rounds += 1
+    throughput = rounds * batch_size / (time.perf_counter() - start)
+    peak = peak_rss_mb()
+
+    # The reference ranking needs the tag vectors, loaded after the RSS reading
+    vectors = SparseSimilarity.load(data_dir).vectors
+    checked = rng.integers(0, n, check_queries)
+    exact = np.array([reference_ranking(vectors, i) for i in checked])
+    got, _ = recommender.model.neighbors_many(checked, K)
+    return {
+        'backend': backend,
+        'movies': n,
+        'load_s': load_s,
+        'peak_rss_mb': peak,
+        'base_rss_mb': rss_before,
+        'recommend': percentiles(latencies),
+        'batch_queries_per_s': throughput,
+        'matches_reference': bool(np.array_equal(exact, got)),
+        'recall_at_5': recall_at_k(exact, got),
+    }
+
+
+class _FakeClient:
+    """OMDB stand-in that answers instantly, so only the cache path is timed"""
+
+    def fetch_movie(self, movie_title, year=None, timeout=10):
+        return {'Title': movie_title, 'Year': '2000', 'imdbRating': '7.0', 'Plot': 'A plot.',
+                'Genre': 'Drama', 'Director': 'Someone', 'Actors': 'Some One', 'Poster': 'N/A',
+                'Runtime': '100 min', 'Awards': 'N/A', 'Response': 'True'}
+
+
+def measure_metadata(work_dir, n=5000):
+    """Timings of cached OMDB lookups: cold (fetch and store), warm (memory) and from SQLite"""
+    from metadata import MetadataService
+    from metadata_cache import MetadataCache, MetadataStore
+
+    path = os.path.join(work_dir, "bench_metadata.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    titles = [f"Synthetic Movie {i}" for i in range(n)]
+
+    store = MetadataStore(path, legacy_file=None)
+    service = MetadataService(_FakeClient(), MetadataCache(store=store))
+    start = time.perf_counter()
+    for title in titles:
+        service.card(title)
+    store.flush()
+    cold = time.perf_counter() - start
+
+    warm = []
+    for title in titles:
+        start = time.perf_counter()
+        service.card(title)
+        warm.append(time.perf_counter() - start)
+
+    # A fresh process-wide cache over the same file, as after a restart
+    restarted = MetadataService(_FakeClient(), MetadataCache(store=store))
+    from_store = []
+    for title in titles:
+        start = time.perf_counter()
+        restarted.card(title)
+        from_store.append(time.perf_counter() - start)
+    store.close()
+    return {
+        'titles': n,
+        'cold_lookups_per_s': n / cold,
+        'warm': percentiles(warm),
+        'from_store': percentiles(from_store),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=SIZES, backends=BACKENDS, work_dir=WORK_DIR, queries=1000, check_queries=50):
+    results = {
+        'commit': git_commit(),
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'catalogs': [],
+    }
+    for n in sizes:
+        data_dir = os.path.join(work_dir, f"n{n}")
+        shutil.rmtree(data_dir, ignore_errors=True)
+        print(f"Building the {n}-movie catalog...", flush=True)
+        catalog = {'movies': n, 'build_s': build_catalog(data_dir, n, backends), 'backends': []}
+
+        for backend in backends:
+            if backend == 'dense' and n > MAX_DENSE:
+                continue
+            out = subprocess.run([sys.executable, __file__, "measure", "--data-dir", data_dir,
+                                  "--backend", backend, "--queries", str(queries),
+                                  "--check-queries", str(check_queries)],
+                                 capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout.splitlines()[-1])
+            catalog['backends'].append(result)
+            print(f"  {backend:<9} load {result['load_s'] * 1000:8.1f} ms  "
+                  f"peak RSS {result['peak_rss_mb']:7.1f} MB  "
+                  f"p50 {result['recommend']['p50_ms']:8.3f} ms  p99 {result['recommend']['p99_ms']:8.3f} ms  "
+                  f"batch {result['batch_queries_per_s']:10.0f} q/s  "
+                  f"{'matches reference' if result['matches_reference'] else 'recall@5 %.3f' % result['recall_at_5']}",
+                  flush=True)
+        results['catalogs'].append(catalog)
+
+    results['metadata'] = measure_metadata(work_dir)
+    print(f"Metadata: {results['metadata']['cold_lookups_per_s']:.0f} cold lookups/s, "
+          f"warm p50 {results['metadata']['warm']['p50_ms']:.4f} ms, "
+          f"from SQLite p50 {results['metadata']['from_store']['p50_ms']:.4f} ms")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command")
+
+    one = commands.add_parser("measure", help="benchmark one backend on a built catalog (used internally)")
+    one.add_argument("--data-dir", required=True)
+    one.add_argument("--backend", choices=BACKENDS, required=True)
+    one.add_argument("--queries", type=int, default=1000)
+    one.add_argument("--check-queries", type=int, default=50)
+
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="catalog sizes to generate")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--queries", type=int, default=1000, help="single recommend() calls timed per backend")
+    parser.add_argument("--check-queries", type=int, default=50,
+                        help="queries compared with the reference ranking")
+    parser.add_argument("--work-dir", default=WORK_DIR, help="where the synthetic catalogs are built")
+    parser.add_argument("--output", default=None,
+                        help=f"results file (default: {RESULTS_DIR}/<timestamp>-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    if args.command == "measure":
+        print(json.dumps(measure(args.data_dir, args.backend, args.queries, check_queries=args.check_queries)))
+        return
+
+    results = run(args.sizes, args.backends, args.work_dir, args.queries, args.check_queries)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{(results['commit'] or 'unknown')[:8]}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
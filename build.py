@@ -0,0 +1,352 @@
+"""Offline build steps for the recommender model files
+
+Usage:
+    python build.py features --movies tmdb_5000_movies.csv --credits tmdb_5000_credits.csv
+    python build.py ann --nlist 1024 --target-recall 0.95
+    python build.py embedding --dims 128
+    python build.py ingest --movies new_movies.csv --credits new_credits.csv
+    python build.py dense
+    python build.py neighbors --k 20
+    python build.py catalog
+    python build.py attributes --movies tmdb_5000_movies.csv
+    python build.py responses --k 10
+"""
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+
+import features
+from engine import (DEFAULT_DIMS, DEFAULT_K, DEFAULT_NPROBE, Attributes, DenseSimilarity, EmbeddingModel, IVFIndex,
+                    NeighborIndex, SparseSimilarity, load_catalog, load_titles, model_version, recall_at_k,
+                    save_catalog, save_responses)
+
+DATA_DIR = "data"
+
+
+def load_similarity(data_dir=DATA_DIR):
+    """Open the dense similarity matrix, preferring the memory-mapped .npy copy"""
+    if DenseSimilarity.exists(data_dir):
+        return DenseSimilarity.load(data_dir).matrix
+    with open(os.path.join(data_dir, "similarity.pkl"), 'rb') as f:
+        return pickle.load(f)
+
+
+def build_dense(data_dir=DATA_DIR, dtype="float32"):
+    """Convert similarity.pkl into similarity.npy, which the app memory-maps"""
+    with open(os.path.join(data_dir, "similarity.pkl"), 'rb') as f:
+        similarity = pickle.load(f)
+    DenseSimilarity(similarity).save(data_dir, dtype=np.dtype(dtype))
+    print(f"Wrote {similarity.shape[0]}x{similarity.shape[1]} {dtype} similarity matrix")
+
+
+def build_neighbors(data_dir=DATA_DIR, k=DEFAULT_K, dtype="float32"):
+    """Turn the dense similarity matrix into a compact top-k neighbor index"""
+    similarity = load_similarity(data_dir)
+
+    start = time.perf_counter()
+    index = NeighborIndex.build(similarity, k=k, dtype=np.dtype(dtype))
+    index.save(data_dir)
+
+    size = index.ids.nbytes + index.scores.nbytes
+    print(f"Built top-{index.k} neighbors for {len(index)} movies "
+          f"in {time.perf_counter() - start:.1f}s "
+          f"({size / 1024:.0f} KB vs {similarity.nbytes / 1024 ** 2:.0f} MB dense)")
+    return index
+
+
+def build_features(movies_csv, credits_csv, data_dir=DATA_DIR, k=DEFAULT_K,
+                   max_features=features.MAX_FEATURES, workers=None,
+                   chunk_size=features.CHUNK_SIZE, use_cache=True):
+    """Rebuild movie_list.pkl, the sparse tag vectors and the neighbor index from the TMDB CSVs"""
+    os.makedirs(data_dir, exist_ok=True)
+    cache_path = os.path.join(data_dir, features.FEATURE_CACHE_FILE) if use_cache else None
+
+    start = time.perf_counter()
+    movies, cache = features.build_tags(movies_csv, credits_csv, cache_path=cache_path,
+                                        workers=workers, chunk_size=chunk_size)
+    print(f"Parsed {len(movies)} movies in {time.perf_counter() - start:.1f}s "
+          f"({cache.hits} cached rows, {cache.misses} parsed)")
+
+    start = time.perf_counter()
+    vectors, vocabulary = features.vectorize(movies['tags'], max_features=max_features)
+    model = features.save_features(data_dir, vectors, vocabulary)
+    with open(os.path.join(data_dir, "movie_list.pkl"), 'wb') as f:
+        pickle.dump(movies, f)
+    save_catalog(data_dir, movies['title'], movies['movie_id'])
+    print(f"Vectorized {vectors.shape[0]}x{vectors.shape[1]} ({vectors.nnz} non-zeros) "
+          f"in {time.perf_counter() - start:.1f}s")
+    features.build_attributes(movies_csv, movies['movie_id'], chunk_size=chunk_size).save(data_dir)
+
+    if k > 0:
+        start = time.perf_counter()
+        index = NeighborIndex.from_features(model.vectors, k=k)
+        index.save(data_dir)
+        print(f"Built top-{index.k} neighbors in {time.perf_counter() - start:.1f}s")
+    return movies, vectors
+
+
+def ingest(movies_csv, credits_csv, data_dir=DATA_DIR, workers=None, chunk_size=features.CHUNK_SIZE):
+    """Append new movies to the catalog and patch the models without a full rebuild
+
+    New movies are vectorized against the frozen vocabulary and only scored
+    against the existing catalog; movies already in the catalog are skipped.
+    """
+    from scipy import sparse
+    import pandas as pd
+    from sklearn.preprocessing import normalize
+
+    start = time.perf_counter()
+    movie_list_path = os.path.join(data_dir, "movie_list.pkl")
+    with open(movie_list_path, 'rb') as f:
+        catalog = pickle.load(f)
+
+    cache_path = os.path.join(data_dir, features.FEATURE_CACHE_FILE)
+    new, _ = features.build_tags(movies_csv, credits_csv, cache_path=cache_path,
+                                 workers=workers, chunk_size=chunk_size)
+    new = new[~new['movie_id'].isin(catalog['movie_id'])].reset_index(drop=True)
+    if new.empty:
+        print("No new movies to ingest")
+        return catalog
+
+    model = SparseSimilarity.load(data_dir)
+    if len(model) != len(catalog):
+        raise ValueError(f"Tag vectors cover {len(model)} movies but the catalog has {len(catalog)}; "
+                         "rebuild with `build.py features`")
+    new_vectors = normalize(features.transform(new['tags'], model.vocabulary), norm='l2').astype(np.float32)
+    vectors = sparse.vstack([model.vectors, new_vectors]).tocsr()
+
+    if NeighborIndex.exists(data_dir):
+        NeighborIndex.load(data_dir).add(vectors).save(data_dir)
+    if IVFIndex.exists(data_dir):
+        IVFIndex.load(data_dir).add(new_vectors).save(data_dir)
+    if EmbeddingModel.exists(data_dir):
+        EmbeddingModel.load(data_dir).add(new_vectors).save(data_dir)
+    SparseSimilarity(vectors, model.vocabulary).save(data_dir)
+
+    if Attributes.exists(data_dir):
+        attributes = Attributes.load(data_dir)
+        new_attributes = features.build_attributes(movies_csv, new['movie_id'], chunk_size=chunk_size)
+        attributes.append(new_attributes).save(data_dir)
+
+    catalog = pd.concat([catalog, new], ignore_index=True)
+    with open(movie_list_path, 'wb') as f:
+        pickle.dump(catalog, f)
+    save_catalog(data_dir, catalog['title'], catalog['movie_id'])
+    print(f"Ingested {len(new)} movies ({len(catalog)} total) in {time.perf_counter() - start:.1f}s")
+
+    if DenseSimilarity.exists(data_dir) or os.path.exists(os.path.join(data_dir, "similarity.pkl")):
+        print("Note: the dense similarity matrix was not updated; serve the neighbors, ivf or sparse model")
+    return catalog
+
+
+def build_catalog(data_dir=DATA_DIR):
+    """Write the slim serving catalog from movie_list.pkl"""
+    with open(os.path.join(data_dir, "movie_list.pkl"), 'rb') as f:
+        movies = pickle.load(f)
+    ids = movies['movie_id'] if 'movie_id' in movies else np.arange(len(movies))
+    save_catalog(data_dir, movies['title'], ids)
+    print(f"Wrote the serving catalog for {len(movies)} movies")
+
+
+def build_attributes(movies_csv, data_dir=DATA_DIR, chunk_size=features.CHUNK_SIZE):
+    """Write the filter columns of the served catalog from a TMDB movies CSV"""
+    titles, ids = load_titles(data_dir)
+    if ids is None:
+        raise ValueError("The catalog has no movie ids to match the CSV against; rebuild it with `build.py features`")
+    start = time.perf_counter()
+    attributes = features.build_attributes(movies_csv, ids, chunk_size=chunk_size)
+    attributes.save(data_dir)
+    known = np.count_nonzero(attributes.year)
+    print(f"Wrote filter columns for {len(titles)} movies ({known} with a release year, "
+          f"{len(attributes.genre_names)} genres) in {time.perf_counter() - start:.1f}s")
+    return attributes
+
+
+def build_responses(data_dir=DATA_DIR, k=10, kind=None, nprobe=None):
+    """Materialize the rankings of every title from the model the app will serve
+
+    Run it after the model is built, with the same RECOMMENDER_MODEL and
+    RECOMMENDER_NPROBE as the app; rankings are ignored by any other model.
+    """
+    titles, _, model = load_catalog(data_dir, kind, nprobe)
+    version = model_version(data_dir, model)
+    start = time.perf_counter()
+    responses = save_responses(data_dir, model, k, version)
+    print(f"Materialized top-{responses.k} rankings of {len(titles)} movies from the {type(model).__name__} model "
+          f"(version {version}) in {time.perf_counter() - start:.1f}s")
+    return responses
+
+
+def report_recall(index, exact, queries, k=5, nprobes=(1, 2, 4, 8, 16, 32, 64)):
+    """Print recall@k and mean latency of the IVF index against the exact sparse model"""
+    exact_ids, _ = exact.neighbors_many(queries, k)
+    results = []
+    for nprobe in nprobes:
+        if nprobe > index.nlist:
+            break
+        index.nprobe = nprobe
+        start = time.perf_counter()
+        approx_ids, _ = index.neighbors_many(queries, k)
+        latency = (time.perf_counter() - start) / len(queries)
+        recall = recall_at_k(exact_ids, approx_ids)
+        results.append((nprobe, recall, latency))
+        print(f"  nprobe={nprobe:<4} recall@{k}={recall:.3f}  {latency * 1000:.3f} ms/query")
+    return results
+
+
+def build_ann(data_dir=DATA_DIR, nlist=None, nprobe=DEFAULT_NPROBE, target_recall=None,
+              eval_queries=500, seed=0):
+    """Build the IVF approximate model over the sparse tag vectors and report its recall"""
+    exact = SparseSimilarity.load(data_dir)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(exact.vectors, nlist=nlist, nprobe=nprobe, seed=seed)
+    print(f"Clustered {len(index)} movies into {index.nlist} lists in {time.perf_counter() - start:.1f}s")
+
+    if eval_queries:
+        rng = np.random.default_rng(seed)
+        queries = rng.choice(len(exact), size=min(eval_queries, len(exact)), replace=False)
+        print(f"Recall against the exact model on {len(queries)} queries:")
+        results = report_recall(index, exact, queries)
+        if target_recall is not None:
+            # Smallest nprobe reaching the target, or the most accurate one tried
+            reaching = [nprobe for nprobe, recall, _ in results if recall >= target_recall]
+            nprobe = reaching[0] if reaching else results[-1][0]
+        index.nprobe = nprobe
+
+    index.save(data_dir)
+    print(f"Saved IVF index with nprobe={index.nprobe}")
+    return index
+
+
+def build_embedding(data_dir=DATA_DIR, dims=DEFAULT_DIMS, target_overlap=None, eval_queries=500,
+                    candidates=(64, 96, 128, 192, 256), seed=0):
+    """Build the SVD embedding model over the sparse tag vectors and report its overlap@5
+
+    With ``target_overlap``, the smallest of ``candidates`` reaching it is
+    kept (or the largest one tried) instead of ``dims``.
+    """
+    exact = SparseSimilarity.load(data_dir)
+    queries = None
+    if eval_queries:
+        rng = np.random.default_rng(seed)
+        queries = rng.choice(len(exact), size=min(eval_queries, len(exact)), replace=False)
+        exact_ids, _ = exact.neighbors_many(queries, 5)
+
+    def report(model, seconds):
+        size = model.embedding.nbytes / 1024 ** 2
+        if queries is None:
+            print(f"  dims={model.dims:<4} built in {seconds:.1f}s, {size:.1f} MB")
+            return None
+        start = time.perf_counter()
+        ids, _ = model.neighbors_many(queries, 5)
+        latency = (time.perf_counter() - start) / len(queries)
+        overlap = recall_at_k(exact_ids, ids)
+        print(f"  dims={model.dims:<4} overlap@5={overlap:.3f}  {latency * 1000:.3f} ms/query  "
+              f"{size:.1f} MB  built in {seconds:.1f}s")
+        return overlap
+
+    if queries is not None:
+        print(f"Overlap with the exact model on {len(queries)} queries:")
+    chosen = None
+    for d in (candidates if target_overlap is not None and queries is not None else (dims,)):
+        start = time.perf_counter()
+        model = EmbeddingModel.build(exact.vectors, dims=d, seed=seed)
+        overlap = report(model, time.perf_counter() - start)
+        chosen = model
+        if target_overlap is not None and overlap is not None and overlap >= target_overlap:
+            break
+        if model.dims < d:
+            # Capped by the number of tag features; more candidates would be the same model
+            break
+
+    chosen.save(data_dir)
+    print(f"Saved a {len(chosen)}x{chosen.dims} float32 embedding")
+    return chosen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build recommender model files")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    feats = commands.add_parser("features", help="build movie_list.pkl and the model from the TMDB CSVs")
+    feats.add_argument("--movies", required=True, help="path to tmdb_5000_movies.csv")
+    feats.add_argument("--credits", required=True, help="path to tmdb_5000_credits.csv")
+    feats.add_argument("--k", type=int, default=DEFAULT_K, help="neighbors kept per movie (0 to skip)")
+    feats.add_argument("--max-features", type=int, default=features.MAX_FEATURES)
+    feats.add_argument("--workers", type=int, default=None, help="parser processes (default: all cores)")
+    feats.add_argument("--chunk-size", type=int, default=features.CHUNK_SIZE, help="CSV rows read at a time")
+    feats.add_argument("--no-cache", action="store_true", help="ignore the parsed feature cache")
+
+    delta = commands.add_parser("ingest", help="append new movies from TMDB-format CSVs without a full rebuild")
+    delta.add_argument("--movies", required=True, help="movies CSV holding only the new movies")
+    delta.add_argument("--credits", required=True, help="credits CSV holding only the new movies")
+    delta.add_argument("--workers", type=int, default=None, help="parser processes (default: all cores)")
+    delta.add_argument("--chunk-size", type=int, default=features.CHUNK_SIZE, help="CSV rows read at a time")
+
+    ann = commands.add_parser("ann", help="build the approximate IVF model over the sparse tag vectors")
+    ann.add_argument("--nlist", type=int, default=None, help="number of clusters (default: sqrt of the catalog size)")
+    ann.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE, help="clusters scanned per query")
+    ann.add_argument("--target-recall", type=float, default=None,
+                     help="pick the smallest nprobe reaching this recall@5 instead of --nprobe")
+    ann.add_argument("--eval-queries", type=int, default=500, help="queries used for the recall report (0 to skip)")
+
+    embed = commands.add_parser("embedding", help="build the SVD embedding model over the sparse tag vectors")
+    embed.add_argument("--dims", type=int, default=DEFAULT_DIMS, help="embedding dimensions (64-256)")
+    embed.add_argument("--target-overlap", type=float, default=None,
+                       help="pick the smallest of 64-256 dimensions reaching this overlap@5 instead of --dims")
+    embed.add_argument("--eval-queries", type=int, default=500, help="queries used for the overlap report (0 to skip)")
+
+    dense = commands.add_parser("dense", help="convert similarity.pkl into memory-mappable similarity.npy")
+    dense.add_argument("--dtype", choices=["float32", "float64"], default="float32",
+                       help="storage type of the similarity matrix")
+
+    neighbors = commands.add_parser("neighbors", help="build the top-k neighbor index from the similarity matrix")
+    neighbors.add_argument("--k", type=int, default=DEFAULT_K, help="neighbors kept per movie")
+    neighbors.add_argument("--dtype", choices=["float32", "float16"], default="float32",
+                           help="storage type of the similarity scores")
+
+    commands.add_parser("catalog", help="write the slim serving catalog from movie_list.pkl")
+
+    attrs = commands.add_parser("attributes", help="write the genre, year, runtime and rating filter columns")
+    attrs.add_argument("--movies", required=True, help="path to tmdb_5000_movies.csv")
+    attrs.add_argument("--chunk-size", type=int, default=features.CHUNK_SIZE, help="CSV rows read at a time")
+
+    responses = commands.add_parser("responses", help="materialize every title's rankings from the served model")
+    responses.add_argument("--k", type=int, default=10, help="neighbors kept per movie")
+    responses.add_argument("--model", default=os.environ.get("RECOMMENDER_MODEL"),
+                           help="model the app serves (default: the first one built)")
+    responses.add_argument("--nprobe", default=os.environ.get("RECOMMENDER_NPROBE"),
+                           help="nprobe override the app serves the ivf model with")
+
+    args = parser.parse_args(argv)
+    if args.command == "features":
+        build_features(args.movies, args.credits, args.data_dir, k=args.k,
+                       max_features=args.max_features, workers=args.workers,
+                       chunk_size=args.chunk_size, use_cache=not args.no_cache)
+    elif args.command == "ingest":
+        ingest(args.movies, args.credits, args.data_dir, workers=args.workers, chunk_size=args.chunk_size)
+    elif args.command == "ann":
+        build_ann(args.data_dir, nlist=args.nlist, nprobe=args.nprobe,
+                  target_recall=args.target_recall, eval_queries=args.eval_queries)
+    elif args.command == "embedding":
+        build_embedding(args.data_dir, dims=args.dims, target_overlap=args.target_overlap,
+                        eval_queries=args.eval_queries)
+    elif args.command == "dense":
+        build_dense(args.data_dir, dtype=args.dtype)
+    elif args.command == "neighbors":
+        build_neighbors(args.data_dir, k=args.k, dtype=args.dtype)
+    elif args.command == "catalog":
+        build_catalog(args.data_dir)
+    elif args.command == "attributes":
+        build_attributes(args.movies, args.data_dir, chunk_size=args.chunk_size)
+    elif args.command == "responses":
+        build_responses(args.data_dir, k=args.k, kind=args.model, nprobe=args.nprobe)
+
+
+if __name__ == "__main__":
+    main()
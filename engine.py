@@ -0,0 +1,1033 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+
+import numpy as np
+
+from titles import TitleIndex
+
+logger = logging.getLogger(__name__)
+
+# Number of neighbors kept per movie by the build step
+DEFAULT_K = 20
+
+MOVIE_LIST_FILE = "movie_list.pkl"
+LEGACY_SIMILARITY_FILE = "similarity.pkl"
+# Slim serving catalog: movie ids, plus the titles as one UTF-8 buffer with
+# Arrow-style offsets, so no DataFrame (or its tags column) is unpickled
+CATALOG_FILES = ("catalog_movie_ids.npy", "catalog_title_offsets.npy", "catalog_title_bytes.npy")
+NEIGHBOR_IDS_FILE = "neighbor_ids.npy"
+NEIGHBOR_SCORES_FILE = "neighbor_scores.npy"
+SIMILARITY_FILE = "similarity.npy"
+VECTOR_FILES = ("tag_vectors_data.npy", "tag_vectors_indices.npy", "tag_vectors_indptr.npy")
+VOCABULARY_FILE = "vocabulary.json"
+IVF_FILES = ("ivf_vectors_data.npy", "ivf_vectors_indices.npy", "ivf_vectors_indptr.npy",
+             "ivf_centroids.npy", "ivf_list_ids.npy", "ivf_list_offsets.npy")
+IVF_SETTINGS_FILE = "ivf.json"
+EMBEDDING_FILES = ("embedding.npy", "embedding_components.npy")
+# Rankings of every title materialized from the served model, for one model version
+RESPONSES_FILES = ("responses_ids.npy", "responses_scores.npy")
+RESPONSES_SETTINGS_FILE = "responses.json"
+# Filter columns aligned with the catalog rows, and the genre of each bit
+ATTRIBUTE_FILES = ("attr_genres.npy", "attr_year.npy", "attr_runtime.npy", "attr_rating.npy")
+GENRES_FILE = "genres.json"
+
+# Inverted lists scanned per query by the approximate model
+DEFAULT_NPROBE = 8
+# Dimensions of the SVD embedding model
+DEFAULT_DIMS = 128
+
+
+def open_array(path):
+    """Open a .npy file as a read-only memory map
+
+    Pages are loaded lazily and live in the OS page cache, so every worker
+    process on the host shares one physical copy of the data.
+    """
+    return np.load(path, mmap_mode='r')
+
+
+def save_array(path, array):
+    """Write a .npy file atomically
+
+    Workers that already memory-mapped the old file keep reading it until
+    they reload, instead of seeing a half-written one.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(temp_path, path)
+
+
+def top_k(scores, k, exclude=None, allowed=None):
+    """Return ids and scores of the k best columns of each row, best first
+
+    Ties are broken by ascending column id, which matches the ranking of
+    ``sorted(enumerate(row), reverse=True, key=lambda x: x[1])``.
+    ``exclude`` holds one column id per row (usually the seed movie) that is
+    never returned. ``allowed`` is an optional boolean mask of the columns
+    that may be returned; fewer than k columns come back if it allows fewer.
+    """
+    scores = np.array(scores, dtype=np.float64, ndmin=2)
+    n_rows, n_cols = scores.shape
+    if allowed is not None:
+        scores[:, ~allowed] = -np.inf
+    if exclude is not None:
+        scores[np.arange(n_rows), np.asarray(exclude)] = -np.inf
+        n_cols -= 1
+    if allowed is not None:
+        n_cols = int(np.isfinite(scores).sum(axis=1).min())
+    k = min(k, n_cols)
+    if k <= 0:
+        return np.empty((n_rows, 0), np.int32), np.empty((n_rows, 0), np.float32)
+
+    # k-th best value of every row, found in O(N) with a partial sort
+    kth_ids = np.argpartition(-scores, k - 1, axis=1)[:, k - 1:k]
+    kth = np.take_along_axis(scores, kth_ids, axis=1)
+
+    # Keep everything strictly above the k-th value, then fill the remaining
+    # slots with the lowest ids that are tied with it
+    above = scores > kth
+    tied = scores == kth
+    needed = k - above.sum(axis=1, keepdims=True)
+    selected = above | (tied & (np.cumsum(tied, axis=1) <= needed))
+    ids = np.nonzero(selected)[1].reshape(n_rows, k)
+
+    picked = np.take_along_axis(scores, ids, axis=1)
+    order = np.lexsort((ids, -picked), axis=1)
+    ids = np.take_along_axis(ids, order, axis=1).astype(np.int32)
+    return ids, np.take_along_axis(picked, order, axis=1).astype(np.float32)
+
+
+def profile_mask(n, seeds, allowed=None):
+    """Boolean mask of the rows a profile query may return: ``allowed`` ones, never the seeds"""
+    mask = np.ones(n, dtype=bool) if allowed is None else np.array(allowed, dtype=bool)
+    mask[np.asarray(seeds, dtype=np.intp)] = False
+    return mask
+
+
+class DenseSimilarity:
+    """Full N x N similarity matrix as produced by the notebook"""
+
+    files = (SIMILARITY_FILE,)
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def neighbors(self, index, k=5, allowed=None):
+        """Top-k neighbor ids and scores for one movie, among the ``allowed`` movies if given"""
+        ids, scores = top_k(self.matrix[index], k, exclude=[index], allowed=allowed)
+        return ids[0], scores[0]
+
+    def profile(self, indices, weights, k=5, allowed=None):
+        """Top-k movies by the weighted sum of the seeds' similarity rows, seeds excluded"""
+        scores = np.asarray(weights, dtype=np.float64) @ np.asarray(self.matrix[np.asarray(indices, dtype=np.intp)])
+        ids, scores = top_k(scores, k, allowed=profile_mask(len(self), indices, allowed))
+        return ids[0], scores[0]
+
+    def neighbors_many(self, indices, k=5, max_block_cells=2 ** 25):
+        """Top-k neighbor ids and scores for many movies, one row block at a time
+
+        ``max_block_cells`` bounds the similarity rows held at once.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        block_size = max(1, min(1024, max_block_cells // max(len(self), 1)))
+        ids = np.empty((len(indices), min(k, len(self) - 1)), dtype=np.int32)
+        scores = np.empty(ids.shape, dtype=np.float32)
+        for start in range(0, len(indices), block_size):
+            rows = indices[start:start + block_size]
+            ids[start:start + len(rows)], scores[start:start + len(rows)] = top_k(
+                self.matrix[rows], k, exclude=rows)
+        return ids, scores
+
+    def save(self, data_dir, dtype=np.float32):
+        save_array(os.path.join(data_dir, SIMILARITY_FILE), np.asarray(self.matrix, dtype=dtype))
+
+    @classmethod
+    def exists(cls, data_dir):
+        return os.path.exists(os.path.join(data_dir, SIMILARITY_FILE))
+
+    @classmethod
+    def load(cls, data_dir):
+        return cls(open_array(os.path.join(data_dir, SIMILARITY_FILE)))
+
+
+class NeighborIndex:
+    """Precomputed top-k neighbor ids and scores for every movie
+
+    Row ``i`` of ``ids`` lists the neighbors of movie ``i`` best first, with
+    the matching similarity in the same slot of ``scores``.
+    """
+
+    files = (NEIGHBOR_IDS_FILE, NEIGHBOR_SCORES_FILE)
+
+    def __init__(self, ids, scores):
+        self.ids = ids
+        self.scores = scores
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    @property
+    def k(self):
+        return self.ids.shape[1]
+
+    def neighbors(self, index, k=5, allowed=None):
+        """Top-k neighbor ids and scores for one movie, read from its slice
+
+        With an ``allowed`` mask only the stored neighbors are filtered, so
+        fewer than k may pass; a model scoring every movie finds more.
+        """
+        if allowed is None:
+            k = min(k, self.k)
+            return np.asarray(self.ids[index, :k]), np.asarray(self.scores[index, :k], dtype=np.float32)
+        ids = np.asarray(self.ids[index])
+        keep = np.flatnonzero((ids >= 0) & allowed[ids])[:k]
+        return ids[keep], np.asarray(self.scores[index], dtype=np.float32)[keep]
+
+    def profile(self, indices, weights, k=5, allowed=None):
+        """Top-k movies by the weighted sum of the seeds' stored neighbor scores, seeds excluded
+
+        Only movies in some seed's stored top neighbors can be returned;
+        a movie missing from a seed's list counts as similarity 0 to it.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        ids = np.asarray(self.ids[indices])
+        contributions = np.asarray(self.scores[indices], dtype=np.float64) * np.asarray(weights)[:, None]
+        valid = ids >= 0
+        candidates, positions = np.unique(ids[valid], return_inverse=True)
+        totals = np.bincount(positions, weights=contributions[valid], minlength=len(candidates))
+        mask = profile_mask(len(self), indices, allowed)[candidates]
+        found, scores = top_k(totals, k, allowed=mask)
+        return candidates[found[0]].astype(np.int32), scores[0]
+
+    def neighbors_many(self, indices, k=5):
+        """Top-k neighbor ids and scores for many movies"""
+        k = min(k, self.k)
+        indices = np.asarray(indices, dtype=np.intp)
+        return np.asarray(self.ids[indices, :k]), np.asarray(self.scores[indices, :k], dtype=np.float32)
+
+    @classmethod
+    def build(cls, similarity, k=DEFAULT_K, dtype=np.float32, block_size=1024):
+        """Build the index from a dense similarity matrix, one row block at a time"""
+        n = similarity.shape[0]
+        k = min(k, n - 1)
+        ids = np.empty((n, k), dtype=np.int32)
+        scores = np.empty((n, k), dtype=dtype)
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            block_ids, block_scores = top_k(similarity[start:stop], k, exclude=np.arange(start, stop))
+            ids[start:stop] = block_ids
+            scores[start:stop] = block_scores
+        return cls(ids, scores)
+
+    @classmethod
+    def from_features(cls, vectors, k=DEFAULT_K, dtype=np.float32):
+        """Build the index from L2-normalized sparse tag vectors, never forming the N x N matrix"""
+        model = SparseSimilarity(vectors)
+        ids, scores = model.neighbors_many(np.arange(len(model)), k)
+        return cls(ids, scores.astype(dtype))
+
+    def add(self, vectors, max_block_cells=2 ** 25):
+        """Extend the index with movies appended to the catalog
+
+        ``vectors`` holds the L2-normalized tag vectors of the whole catalog,
+        new movies last. New movies get their full top-k; existing movies
+        only take a new movie into their list when it beats their current
+        k-th neighbor, so the result matches ``from_features(vectors)``
+        without scoring old movies against each other again.
+        """
+        from scipy import sparse
+
+        vectors = sparse.csr_matrix(vectors)
+        n_old, n = len(self), vectors.shape[0]
+        new_rows = np.arange(n_old, n)
+        old_vectors, new_vectors = vectors[:n_old], vectors[n_old:]
+
+        ids = np.empty((n, self.k), dtype=np.int32)
+        scores = np.empty((n, self.k), dtype=self.scores.dtype)
+        ids[n_old:], scores[n_old:] = SparseSimilarity(vectors).neighbors_many(new_rows, self.k)
+
+        # Old neighbors first, then new ids in ascending order: top_k breaks
+        # ties by column, which keeps ties ordered by movie id
+        # Scores are computed as in SparseSimilarity.neighbors_many, so they
+        # are bit-for-bit the ones a full rebuild would produce
+        block_size = max(1, min(1024, max_block_cells // max(n - n_old, vectors.shape[1])))
+        for start in range(0, n_old, block_size):
+            stop = min(start + block_size, n_old)
+            block = old_vectors[start:stop].toarray().astype(np.float32)
+            candidate_ids = np.hstack([self.ids[start:stop],
+                                       np.broadcast_to(new_rows.astype(np.int32), (stop - start, n - n_old))])
+            candidate_scores = np.hstack([self.scores[start:stop].astype(np.float32),
+                                          (new_vectors @ block.T).T])
+            best, scores[start:stop] = top_k(candidate_scores, self.k)
+            ids[start:stop] = np.take_along_axis(candidate_ids, best, axis=1)
+        return NeighborIndex(ids, scores)
+
+    def save(self, data_dir):
+        save_array(os.path.join(data_dir, NEIGHBOR_IDS_FILE), self.ids)
+        save_array(os.path.join(data_dir, NEIGHBOR_SCORES_FILE), self.scores)
+
+    @classmethod
+    def exists(cls, data_dir):
+        return (os.path.exists(os.path.join(data_dir, NEIGHBOR_IDS_FILE))
+                and os.path.exists(os.path.join(data_dir, NEIGHBOR_SCORES_FILE)))
+
+    @classmethod
+    def load(cls, data_dir):
+        ids = open_array(os.path.join(data_dir, NEIGHBOR_IDS_FILE))
+        scores = open_array(os.path.join(data_dir, NEIGHBOR_SCORES_FILE))
+        return cls(ids, scores)
+
+
+class SparseSimilarity:
+    """Similarity computed at query time from L2-normalized sparse tag vectors
+
+    Only the CountVectorizer matrix is stored, so memory grows with its
+    number of non-zeros instead of with the square of the catalog size.
+    A movie's similarity row is the product of the matrix with its vector.
+    """
+
+    files = VECTOR_FILES + (VOCABULARY_FILE,)
+
+    def __init__(self, vectors, vocabulary=None):
+        self.vectors = vectors.tocsr()
+        self.vocabulary = vocabulary
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def _rows(self, indices):
+        return self.vectors[indices].toarray().astype(np.float32)
+
+    def neighbors(self, index, k=5, allowed=None):
+        """Top-k neighbor ids and scores for one movie, among the ``allowed`` movies if given"""
+        scores = self.vectors @ self._rows([index])[0]
+        ids, scores = top_k(scores, k, exclude=[index], allowed=allowed)
+        return ids[0], scores[0]
+
+    def profile(self, indices, weights, k=5, allowed=None):
+        """Top-k movies for a weighted combination of the seeds' vectors, seeds excluded
+
+        Scoring the combined vector once equals summing the seeds' weighted
+        similarity rows, at the cost of a single-title query.
+        """
+        query = np.asarray(weights, dtype=np.float32) @ self._rows(np.asarray(indices, dtype=np.intp))
+        ids, scores = top_k(self.vectors @ query, k, allowed=profile_mask(len(self), indices, allowed))
+        return ids[0], scores[0]
+
+    def neighbors_many(self, indices, k=5, max_block_cells=2 ** 25):
+        """Top-k neighbor ids and scores for many movies, one row block at a time
+
+        ``max_block_cells`` bounds the dense similarity block held at once.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        n = len(self)
+        block_size = max(1, min(1024, max_block_cells // max(n, 1)))
+        ids = np.empty((len(indices), min(k, n - 1)), dtype=np.int32)
+        scores = np.empty(ids.shape, dtype=np.float32)
+        for start in range(0, len(indices), block_size):
+            rows = indices[start:start + block_size]
+            block = (self.vectors @ self._rows(rows).T).T
+            ids[start:start + len(rows)], scores[start:start + len(rows)] = top_k(block, k, exclude=rows)
+        return ids, scores
+
+    def save(self, data_dir):
+        vectors = self.vectors
+        for name, array in zip(VECTOR_FILES, (vectors.data, vectors.indices, vectors.indptr)):
+            save_array(os.path.join(data_dir, name), array)
+        with open(os.path.join(data_dir, VOCABULARY_FILE), 'w') as f:
+            json.dump(self.vocabulary, f)
+
+    @classmethod
+    def exists(cls, data_dir):
+        return all(os.path.exists(os.path.join(data_dir, name)) for name in VECTOR_FILES + (VOCABULARY_FILE,))
+
+    @classmethod
+    def load(cls, data_dir):
+        from scipy import sparse
+
+        with open(os.path.join(data_dir, VOCABULARY_FILE), 'r') as f:
+            vocabulary = json.load(f)
+        data, indices, indptr = (open_array(os.path.join(data_dir, name)) for name in VECTOR_FILES)
+        vectors = sparse.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, len(vocabulary)), copy=False)
+        return cls(vectors, vocabulary)
+
+
+class IVFIndex:
+    """Approximate neighbors from an inverted-file index over the tag vectors
+
+    Movies are clustered around ``nlist`` centroids with spherical k-means
+    and their vectors are stored grouped by cluster, so each inverted list
+    is one contiguous slice of the CSR arrays. A query only scores the
+    movies of its ``nprobe`` closest clusters; raising ``nprobe`` trades
+    latency for recall.
+    """
+
+    files = IVF_FILES + (IVF_SETTINGS_FILE,)
+
+    def __init__(self, vectors, centroids, list_ids, list_offsets, nprobe=DEFAULT_NPROBE):
+        # Row i of vectors is movie list_ids[i]
+        self.vectors = vectors.tocsr()
+        self.centroids = centroids
+        self.list_ids = list_ids
+        self.list_offsets = list_offsets
+        self.nprobe = nprobe
+        self.rows = np.empty(len(list_ids), dtype=np.int32)
+        self.rows[list_ids] = np.arange(len(list_ids), dtype=np.int32)
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def nlist(self):
+        return self.centroids.shape[0]
+
+    def _query(self, index):
+        start, stop = self.vectors.indptr[self.rows[index]:self.rows[index] + 2]
+        return self.vectors.indices[start:stop], self.vectors.data[start:stop]
+
+    def _score_list(self, cluster, query):
+        """Dot products of every movie in one cluster with a dense query vector"""
+        first, last = self.list_offsets[cluster], self.list_offsets[cluster + 1]
+        if first == last:
+            return np.empty(0, dtype=np.float32)
+        # Summed in the same order as the sparse products of neighbors_many,
+        # so one query scores bit-for-bit like a block of them
+        return np.asarray(self.vectors[first:last] @ query, dtype=np.float32)
+
+    def neighbors(self, index, k=5, allowed=None):
+        """Approximate top-k neighbor ids and scores for one movie, among the ``allowed`` movies if given"""
+        terms, weights = self._query(index)
+        query = np.zeros(self.vectors.shape[1], dtype=np.float32)
+        query[terms] = weights
+
+        # Only the query's non-zero terms contribute to its centroid scores
+        centroid_scores = self.centroids[:, terms] @ weights
+        return self._search(query, centroid_scores, [index], k, allowed)
+
+    def profile(self, indices, weights, k=5, allowed=None):
+        """Approximate top-k movies for a weighted combination of the seeds' vectors, seeds excluded"""
+        seeds = self.vectors[self.rows[np.asarray(indices, dtype=np.intp)]]
+        query = np.asarray(seeds.T @ np.asarray(weights, dtype=np.float32), dtype=np.float32).ravel()
+        return self._search(query, self.centroids @ query, indices, k, allowed)
+
+    def _search(self, query, centroid_scores, seeds, k, allowed):
+        """Score the movies of the ``nprobe`` best clusters and keep the top k, never the seeds"""
+        probes = np.argpartition(-centroid_scores, min(self.nprobe, self.nlist) - 1)[:self.nprobe]
+
+        candidates = np.concatenate([self.list_ids[self.list_offsets[p]:self.list_offsets[p + 1]] for p in probes])
+        scores = np.concatenate([self._score_list(p, query) for p in probes])
+        # Sorted ids keep ties ordered the same way as the exact models
+        order = np.argsort(candidates, kind='stable')
+        candidates, scores = candidates[order], scores[order]
+        rejected = np.isin(candidates, seeds)
+        if allowed is not None:
+            rejected |= ~allowed[candidates]
+        scores[rejected] = -np.inf
+
+        ids, scores = top_k(scores, min(k, len(candidates) - np.count_nonzero(rejected)))
+        return candidates[ids[0]].astype(np.int32), scores[0]
+
+    def neighbors_many(self, indices, k=5, max_block_cells=2 ** 25):
+        """Approximate top-k neighbor ids and scores for many movies, one block of queries at a time
+
+        Each probed list is scored against all the queries of a block that
+        probe it with one sparse product, so the Python work grows with the
+        number of lists rather than of queries. Rows are padded with id -1
+        when the probed clusters hold fewer than k movies.
+        ``max_block_cells`` bounds the candidate scores held at once.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        k = min(k, len(self) - 1)
+        nprobe = min(self.nprobe, self.nlist)
+        sizes = np.diff(self.list_offsets)
+        # Most candidates a query can have: its probes are the largest lists
+        width = max(int(np.sort(sizes)[-nprobe:].sum()), 1)
+        block_size = max(1, min(1024, max_block_cells // width))
+        ids = np.full((len(indices), k), -1, dtype=np.int32)
+        scores = np.full((len(indices), k), -np.inf, dtype=np.float32)
+        for start in range(0, len(indices), block_size):
+            rows = indices[start:start + block_size]
+            found_ids, found_scores = self._search_many(rows, k, nprobe, width)
+            ids[start:start + len(rows), :found_ids.shape[1]] = found_ids
+            scores[start:start + len(rows), :found_ids.shape[1]] = found_scores
+        return ids, scores
+
+    def _search_many(self, indices, k, nprobe, width):
+        """``neighbors`` for a block of movies; missing neighbors have id -1 and score -inf"""
+        queries = self.vectors[self.rows[indices]]
+        centroid_scores = np.asarray((queries @ self.centroids.T), dtype=np.float32)
+        probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+
+        # Each query's candidates fill one padded row, list after list
+        probe_sizes = np.diff(self.list_offsets)[probes]
+        slots = np.cumsum(probe_sizes, axis=1) - probe_sizes
+        candidates = np.full((len(indices), width), len(self), dtype=np.int64)
+        scores = np.full((len(indices), width), -np.inf, dtype=np.float32)
+        for cluster in np.unique(probes):
+            first, last = self.list_offsets[cluster], self.list_offsets[cluster + 1]
+            if first == last:
+                continue
+            query_rows, probe = np.nonzero(probes == cluster)
+            products = (self.vectors[first:last] @ queries[query_rows].T).T.toarray()
+            columns = slots[query_rows, probe][:, None] + np.arange(last - first)
+            candidates[query_rows[:, None], columns] = self.list_ids[first:last]
+            scores[query_rows[:, None], columns] = products
+
+        # Sorted ids keep ties ordered the same way as the exact models
+        order = np.argsort(candidates, axis=1, kind='stable')
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        scores = np.take_along_axis(scores, order, axis=1)
+        scores[candidates == np.asarray(indices)[:, None]] = -np.inf
+
+        top_ids, top_scores = top_k(scores, min(k, width))
+        found = np.take_along_axis(candidates, top_ids, axis=1).astype(np.int32)
+        found[~np.isfinite(top_scores)] = -1
+        return found, top_scores
+
+    @classmethod
+    def build(cls, vectors, nlist=None, iterations=10, sample_size=100000, nprobe=DEFAULT_NPROBE, seed=0):
+        """Cluster L2-normalized tag vectors and build the inverted lists"""
+        from scipy import sparse
+
+        vectors = vectors.tocsr()
+        n = vectors.shape[0]
+        nlist = min(nlist or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(seed)
+
+        # Spherical k-means on a sample, then assign every movie in blocks
+        sample = vectors[rng.choice(n, size=min(sample_size, n), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].toarray()
+        for _ in range(iterations):
+            assignment = np.asarray((sample @ centroids.T).argmax(axis=1)).ravel()
+            members = sparse.csr_matrix((np.ones(len(assignment)), (assignment, np.arange(len(assignment)))),
+                                        shape=(nlist, len(assignment)))
+            sums = (members @ sample).toarray()
+            # Empty clusters keep their previous centroid
+            empty = np.asarray(members.sum(axis=1)).ravel() == 0
+            sums[empty] = centroids[empty]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms > 0, norms, 1)
+        centroids = centroids.astype(np.float32)
+
+        return cls._from_assignment(vectors, centroids, cls._assign(vectors, centroids), nprobe)
+
+    @staticmethod
+    def _assign(vectors, centroids):
+        """Closest centroid of every row, computed in blocks"""
+        assignment = np.empty(vectors.shape[0], dtype=np.int32)
+        block_size = max(1, 2 ** 25 // max(centroids.shape[0], 1))
+        for start in range(0, vectors.shape[0], block_size):
+            block = vectors[start:start + block_size] @ centroids.T
+            assignment[start:start + block_size] = np.asarray(block).argmax(axis=1).ravel()
+        return assignment
+
+    @classmethod
+    def _from_assignment(cls, vectors, centroids, assignment, nprobe):
+        nlist = centroids.shape[0]
+        list_ids = np.argsort(assignment, kind='stable').astype(np.int32)
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=nlist), out=list_offsets[1:])
+        return cls(vectors[list_ids], centroids, list_ids, list_offsets, nprobe=nprobe)
+
+    def add(self, new_vectors):
+        """Extend the index with movies appended to the catalog, keeping the centroids"""
+        from scipy import sparse
+
+        assignment = np.empty(len(self), dtype=np.int32)
+        assignment[self.list_ids] = np.repeat(np.arange(self.nlist, dtype=np.int32), np.diff(self.list_offsets))
+        assignment = np.concatenate([assignment, self._assign(new_vectors, self.centroids)])
+        vectors = sparse.vstack([self.vectors[self.rows], new_vectors]).tocsr()
+        return self._from_assignment(vectors, self.centroids, assignment, self.nprobe)
+
+    def save(self, data_dir):
+        vectors = self.vectors
+        arrays = (vectors.data, vectors.indices, vectors.indptr, self.centroids, self.list_ids, self.list_offsets)
+        for name, array in zip(IVF_FILES, arrays):
+            save_array(os.path.join(data_dir, name), array)
+        with open(os.path.join(data_dir, IVF_SETTINGS_FILE), 'w') as f:
+            json.dump({'nprobe': self.nprobe, 'n_features': vectors.shape[1]}, f)
+
+    @classmethod
+    def exists(cls, data_dir):
+        return all(os.path.exists(os.path.join(data_dir, name)) for name in IVF_FILES + (IVF_SETTINGS_FILE,))
+
+    @classmethod
+    def load(cls, data_dir):
+        from scipy import sparse
+
+        with open(os.path.join(data_dir, IVF_SETTINGS_FILE), 'r') as f:
+            settings = json.load(f)
+        data, indices, indptr, centroids, list_ids, list_offsets = (
+            open_array(os.path.join(data_dir, name)) for name in IVF_FILES)
+        vectors = sparse.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, settings['n_features']), copy=False)
+        return cls(vectors, centroids, list_ids, list_offsets, nprobe=settings['nprobe'])
+
+
+class Attributes:
+    """Per-movie filter columns, row ``i`` describing catalog row ``i``
+
+    ``genres`` is a bitmask with bit ``b`` set for genre ``genre_names[b]``;
+    ``year`` and ``runtime`` are 0 and ``rating`` is NaN when unknown. The
+    columns are memory-mapped, and ``mask`` turns filters into one boolean
+    array with vectorized comparisons, so no metadata is fetched per movie.
+    """
+
+    files = ATTRIBUTE_FILES + (GENRES_FILE,)
+
+    def __init__(self, genres, year, runtime, rating, genre_names):
+        self.genres = genres
+        self.year = year
+        self.runtime = runtime
+        self.rating = rating
+        self.genre_names = list(genre_names)
+
+    def __len__(self):
+        return len(self.year)
+
+    def genre_bits(self, genres):
+        """Bitmask of genre names, raising ValueError for unknown ones"""
+        unknown = [genre for genre in genres if genre not in self.genre_names]
+        if unknown:
+            raise ValueError(f"Unknown genres {unknown}, expected some of {self.genre_names}")
+        return np.uint64(sum(1 << self.genre_names.index(genre) for genre in set(genres)))
+
+    def mask(self, genres=None, min_year=None, max_year=None, min_runtime=None, max_runtime=None, min_rating=None):
+        """Boolean array of the movies matching every filter given
+
+        Movies must have all of ``genres``. Movies whose value is unknown
+        never pass a filter on that value.
+        """
+        allowed = np.ones(len(self), dtype=bool)
+        if genres:
+            required = self.genre_bits(genres)
+            allowed &= (self.genres & required) == required
+        if min_year is not None:
+            allowed &= self.year >= min_year
+        if max_year is not None:
+            allowed &= (self.year > 0) & (self.year <= max_year)
+        if min_runtime is not None:
+            allowed &= self.runtime >= min_runtime
+        if max_runtime is not None:
+            allowed &= (self.runtime > 0) & (self.runtime <= max_runtime)
+        if min_rating is not None:
+            # NaN compares False
+            allowed &= self.rating >= min_rating
+        return allowed
+
+    def append(self, other):
+        """Attributes of this catalog followed by ``other``'s rows, merging the genre lists"""
+        names = self.genre_names + [name for name in other.genre_names if name not in self.genre_names]
+        if len(names) > 64:
+            raise ValueError(f"{len(names)} genres do not fit in a 64-bit mask")
+        # Remap other's bits onto the merged genre order
+        remapped = np.zeros(len(other), dtype=np.uint64)
+        for bit, name in enumerate(other.genre_names):
+            has = (other.genres >> np.uint64(bit)) & np.uint64(1)
+            remapped |= has << np.uint64(names.index(name))
+        return Attributes(np.concatenate([self.genres, remapped]), np.concatenate([self.year, other.year]),
+                          np.concatenate([self.runtime, other.runtime]), np.concatenate([self.rating, other.rating]),
+                          names)
+
+    def save(self, data_dir):
+        for name, column in zip(ATTRIBUTE_FILES, (self.genres, self.year, self.runtime, self.rating)):
+            save_array(os.path.join(data_dir, name), column)
+        with open(os.path.join(data_dir, GENRES_FILE), 'w') as f:
+            json.dump(self.genre_names, f)
+
+    @classmethod
+    def exists(cls, data_dir):
+        return all(os.path.exists(os.path.join(data_dir, name)) for name in cls.files)
+
+    @classmethod
+    def load(cls, data_dir):
+        with open(os.path.join(data_dir, GENRES_FILE), 'r') as f:
+            genre_names = json.load(f)
+        return cls(*(open_array(os.path.join(data_dir, name)) for name in ATTRIBUTE_FILES), genre_names)
+
+
+class EmbeddingModel:
+    """Dense low-dimensional embedding of the tag vectors, from a truncated SVD
+
+    Row ``i`` of ``embedding`` is movie ``i`` projected on the top ``d``
+    singular directions and L2-normalized, so a query is one N x d
+    matrix-vector product (cache-friendly BLAS) plus top-k. The model is
+    N x d float32 instead of N x N, and ``d`` trades size and latency
+    against how closely the ranking follows the exact model.
+    ``components`` projects tag vectors of movies added later.
+    """
+
+    files = EMBEDDING_FILES
+
+    def __init__(self, embedding, components):
+        self.embedding = embedding
+        self.components = components
+
+    def __len__(self):
+        return self.embedding.shape[0]
+
+    @property
+    def dims(self):
+        return self.embedding.shape[1]
+
+    def neighbors(self, index, k=5, allowed=None):
+        """Top-k neighbor ids and scores for one movie, among the ``allowed`` movies if given"""
+        ids, scores = top_k(self.embedding @ self.embedding[index], k, exclude=[index], allowed=allowed)
+        return ids[0], scores[0]
+
+    def neighbors_many(self, indices, k=5, max_block_cells=2 ** 25):
+        """Top-k neighbor ids and scores for many movies, one block of queries per matrix product
+
+        ``max_block_cells`` bounds the score block held at once.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        block_size = max(1, min(1024, max_block_cells // max(len(self), 1)))
+        ids = np.empty((len(indices), min(k, len(self) - 1)), dtype=np.int32)
+        scores = np.empty(ids.shape, dtype=np.float32)
+        for start in range(0, len(indices), block_size):
+            rows = indices[start:start + block_size]
+            ids[start:start + len(rows)], scores[start:start + len(rows)] = top_k(
+                self.embedding[rows] @ self.embedding.T, k, exclude=rows)
+        return ids, scores
+
+    def profile(self, indices, weights, k=5, allowed=None):
+        """Top-k movies for a weighted combination of the seeds' embeddings, seeds excluded"""
+        query = np.asarray(weights, dtype=np.float32) @ self.embedding[np.asarray(indices, dtype=np.intp)]
+        ids, scores = top_k(self.embedding @ query, k, allowed=profile_mask(len(self), indices, allowed))
+        return ids[0], scores[0]
+
+    @classmethod
+    def build(cls, vectors, dims=DEFAULT_DIMS, seed=0):
+        """Fit a truncated SVD of the tag vectors and keep the normalized projections"""
+        from sklearn.decomposition import TruncatedSVD
+
+        dims = min(dims, vectors.shape[1] - 1)
+        svd = TruncatedSVD(n_components=dims, random_state=seed)
+        embedding = svd.fit_transform(vectors)
+        return cls(cls._normalize(embedding), svd.components_.astype(np.float32))
+
+    @staticmethod
+    def _normalize(embedding):
+        norms = np.linalg.norm(embedding, axis=1, keepdims=True)
+        return (embedding / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+    def add(self, new_vectors):
+        """Embedding with movies appended, projected on the existing components"""
+        new = self._normalize(np.asarray(new_vectors @ self.components.T))
+        return EmbeddingModel(np.vstack([self.embedding, new]), self.components)
+
+    def save(self, data_dir):
+        embedding_file, components_file = (os.path.join(data_dir, name) for name in EMBEDDING_FILES)
+        save_array(embedding_file, np.asarray(self.embedding, dtype=np.float32))
+        save_array(components_file, np.asarray(self.components, dtype=np.float32))
+
+    @classmethod
+    def exists(cls, data_dir):
+        return all(os.path.exists(os.path.join(data_dir, name)) for name in EMBEDDING_FILES)
+
+    @classmethod
+    def load(cls, data_dir):
+        return cls(*(open_array(os.path.join(data_dir, name)) for name in EMBEDDING_FILES))
+
+
+def recall_at_k(exact_ids, approx_ids):
+    """Mean share of the exact top-k neighbors that the approximate model also returns"""
+    k = exact_ids.shape[1]
+    hits = [len(set(exact[:k]) & set(approx[:k])) for exact, approx in zip(exact_ids, approx_ids)]
+    return sum(hits) / (k * len(hits)) if hits else 1.0
+
+
+# Model types by name, in the order load_model() prefers them
+MODELS = {
+    'neighbors': NeighborIndex,
+    'ivf': IVFIndex,
+    'sparse': SparseSimilarity,
+    'dense': DenseSimilarity,
+    'embedding': EmbeddingModel,
+}
+
+
+def load_model(data_dir, kind=None):
+    """Open the model named by ``kind``, or the first one built in ``data_dir``"""
+    if kind:
+        if kind not in MODELS:
+            raise ValueError(f"Unknown model type '{kind}', expected one of {list(MODELS)}")
+        return MODELS[kind].load(data_dir)
+    for model in MODELS.values():
+        if model.exists(data_dir):
+            return model.load(data_dir)
+    return None
+
+
+def save_catalog(data_dir, titles, ids):
+    """Write the titles and movie ids the app serves; row ``i`` is row ``i`` of every model"""
+    encoded = [str(title).encode('utf-8') for title in titles]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(title) for title in encoded], out=offsets[1:])
+    ids_file, offsets_file, bytes_file = (os.path.join(data_dir, name) for name in CATALOG_FILES)
+    save_array(ids_file, np.asarray(ids, dtype=np.int64))
+    save_array(offsets_file, offsets)
+    save_array(bytes_file, np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+
+def catalog_exists(data_dir):
+    return all(os.path.exists(os.path.join(data_dir, name)) for name in CATALOG_FILES)
+
+
+def load_titles(data_dir):
+    """Titles and movie ids of the catalog, from the slim files or movie_list.pkl
+
+    ``ids`` is None for an old movie_list.pkl without a movie_id column.
+    """
+    if catalog_exists(data_dir):
+        ids, offsets, buffer = (np.load(os.path.join(data_dir, name)) for name in CATALOG_FILES)
+        buffer = buffer.tobytes()
+        titles = [buffer[start:end].decode('utf-8') for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+        return titles, ids
+
+    # Unpickling the DataFrame imports pandas and reads the unused tags column
+    with open(os.path.join(data_dir, MOVIE_LIST_FILE), 'rb') as f:
+        movies = pickle.load(f)
+    ids = movies['movie_id'].values if 'movie_id' in movies else None
+    return movies['title'].tolist(), ids
+
+
+def load_catalog(data_dir, kind=None, nprobe=None):
+    """Open the titles and the model, raising FileNotFoundError if either is missing
+
+    Prefers the memory-mapped files written by build.py, so the OS page
+    cache is shared by every worker instead of each one unpickling a copy.
+    Returns ``(titles, ids, model)``.
+    """
+    start = time.perf_counter()
+    titles, ids = load_titles(data_dir)
+    loaded = time.perf_counter()
+
+    model = load_model(data_dir, kind)
+    if model is None:
+        with open(os.path.join(data_dir, LEGACY_SIMILARITY_FILE), 'rb') as f:
+            model = DenseSimilarity(pickle.load(f))
+    if nprobe and hasattr(model, 'nprobe'):
+        model.nprobe = int(nprobe)
+
+    logger.info("Loaded %d titles in %.0f ms (%s), %s model in %.0f ms", len(titles), (loaded - start) * 1000,
+                "slim catalog" if catalog_exists(data_dir) else MOVIE_LIST_FILE, type(model).__name__,
+                (time.perf_counter() - loaded) * 1000)
+    return titles, ids, model
+
+
+def model_version(data_dir, model):
+    """Fingerprint of the served catalog and model files
+
+    Changes whenever build.py rewrites them (files are replaced atomically,
+    so their size or mtime changes) or the model's ``nprobe`` is overridden.
+    """
+    names = list(CATALOG_FILES) if catalog_exists(data_dir) else [MOVIE_LIST_FILE]
+    model_files = [name for name in getattr(model, 'files', ()) if os.path.exists(os.path.join(data_dir, name))]
+    names += model_files or [LEGACY_SIMILARITY_FILE]
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(f"{type(model).__name__}:{getattr(model, 'nprobe', '')}".encode('utf-8'))
+    for name in names:
+        stat = os.stat(os.path.join(data_dir, name))
+        digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def save_responses(data_dir, model, k, version, block_size=4096):
+    """Materialize the top-k rankings of every title from ``model``, tagged with its version"""
+    n = len(model)
+    ids = np.full((n, min(k, n - 1)), -1, dtype=np.int32)
+    scores = np.zeros(ids.shape, dtype=np.float32)
+    for start in range(0, n, block_size):
+        block_ids, block_scores = model.neighbors_many(np.arange(start, min(start + block_size, n)), k)
+        ids[start:start + len(block_ids), :block_ids.shape[1]] = block_ids
+        scores[start:start + len(block_ids), :block_ids.shape[1]] = block_scores
+    ids_file, scores_file = (os.path.join(data_dir, name) for name in RESPONSES_FILES)
+    save_array(ids_file, ids)
+    save_array(scores_file, scores)
+    with open(os.path.join(data_dir, RESPONSES_SETTINGS_FILE), 'w') as f:
+        json.dump({'version': version, 'model': type(model).__name__, 'k': ids.shape[1]}, f)
+    return NeighborIndex(ids, scores)
+
+
+def load_responses(data_dir, version):
+    """Materialized rankings built for ``version``, or None if missing or built for another model"""
+    settings_file = os.path.join(data_dir, RESPONSES_SETTINGS_FILE)
+    if not os.path.exists(settings_file):
+        return None
+    with open(settings_file, 'r') as f:
+        settings = json.load(f)
+    if settings.get('version') != version:
+        logger.info("Ignoring materialized rankings built for another model version")
+        return None
+    ids_file, scores_file = (os.path.join(data_dir, name) for name in RESPONSES_FILES)
+    return NeighborIndex(open_array(ids_file), open_array(scores_file))
+
+
+def load_attributes(data_dir, n_titles):
+    """Filter columns of the catalog, or None if missing or built for another catalog"""
+    if not Attributes.exists(data_dir):
+        return None
+    attributes = Attributes.load(data_dir)
+    if len(attributes) != n_titles:
+        logger.warning("Ignoring attribute columns for %d movies; the catalog has %d", len(attributes), n_titles)
+        return None
+    return attributes
+
+
+def load_extras(data_dir, model, n_titles):
+    """Optional serving files next to ``model``, as keyword arguments of ``Recommender``
+
+    ``version`` and the rankings materialized for it, the filter columns,
+    and the sparse tag vectors as ``filter_model`` when the served model
+    only stores each movie's top neighbors and cannot filter or combine
+    seeds beyond them.
+    """
+    version = model_version(data_dir, model)
+    filter_model = None
+    if isinstance(model, NeighborIndex) and SparseSimilarity.exists(data_dir):
+        filter_model = SparseSimilarity.load(data_dir)
+    return {
+        'version': version,
+        'responses': load_responses(data_dir, version),
+        'attributes': load_attributes(data_dir, n_titles),
+        'filter_model': filter_model,
+    }
+
+
+class Recommender:
+    """Ranks similar movies by title on top of any similarity model
+
+    ``model`` is one of the model classes in this module; they all expose
+    ``neighbors(index, k)`` and ``neighbors_many(indices, k)``. ``version``
+    identifies the model files (see ``model_version``); rankings
+    materialized for that version, if given as ``responses``, answer
+    queries for up to their k without touching the model. ``attributes``
+    enables filtered queries. Filtered and taste-profile queries are
+    answered by ``filter_model`` if given.
+    """
+
+    def __init__(self, titles, model, ids=None, version=None, responses=None, attributes=None, filter_model=None):
+        self.titles = np.asarray(titles, dtype=object)
+        self.ids = np.asarray(ids) if ids is not None else None
+        self.model = model
+        self.version = version
+        self.responses = responses
+        self.attributes = attributes
+        self.filter_model = filter_model
+        self.title_index = TitleIndex(self.titles, ids=ids)
+
+    @classmethod
+    def load(cls, data_dir, kind=None, nprobe=None):
+        """Recommender over the catalog and model stored in ``data_dir``"""
+        titles, ids, model = load_catalog(data_dir, kind, nprobe)
+        extras = load_extras(data_dir, model, len(titles))
+        start = time.perf_counter()
+        recommender = cls(titles, model, ids=ids, **extras)
+        logger.info("Built the title index in %.0f ms", (time.perf_counter() - start) * 1000)
+        return recommender
+
+    def __len__(self):
+        return len(self.titles)
+
+    def resolve(self, titles):
+        """Map titles to row positions, raising KeyError for unknown titles"""
+        missing = [title for title in titles if title not in self.title_index]
+        if missing:
+            raise KeyError(f"Unknown titles: {missing[:5]}")
+        return np.fromiter((self.title_index.lookup(title) for title in titles), dtype=np.intp, count=len(titles))
+
+    def allowed(self, **filters):
+        """Boolean mask of the movies passing ``filters`` (see ``Attributes.mask``), or None without filters
+
+        Raises ValueError if filters are given but no attributes were built.
+        """
+        filters = {name: value for name, value in filters.items() if value not in (None, [], ())}
+        if not filters:
+            return None
+        if self.attributes is None:
+            raise ValueError("Filtering needs the attribute columns; run `build.py attributes`")
+        return self.attributes.mask(**filters)
+
+    def neighbors(self, index, k=5, allowed=None):
+        """Top-k neighbor ids and scores for one row, among the ``allowed`` rows if given
+
+        Unfiltered queries read the materialized rankings when they go deep enough.
+        """
+        if allowed is not None:
+            return (self.filter_model or self.model).neighbors(index, k, allowed=allowed)
+        if self.responses is not None and k <= self.responses.k:
+            ids, scores = self.responses.neighbors(index, k)
+            # Approximate models may have found fewer than k neighbors
+            keep = ids >= 0
+            return ids[keep], scores[keep]
+        return self.model.neighbors(index, k)
+
+    def neighbors_many(self, indices, k=5):
+        """Top-k neighbor ids and scores for many rows; short rows are padded with -1"""
+        if self.responses is not None and k <= self.responses.k:
+            return self.responses.neighbors_many(indices, k)
+        return self.model.neighbors_many(indices, k)
+
+    def recommend(self, title, k=5, **filters):
+        """Top-k (title, score) pairs for one seed title
+
+        Filters such as ``genres=["Comedy"], min_year=2000, min_rating=7``
+        are applied as a mask before the top-k selection, so up to k
+        matching movies are returned at about the cost of an unfiltered query.
+        """
+        ids, scores = self.neighbors(self.resolve([title])[0], k, allowed=self.allowed(**filters))
+        return list(zip(self.titles[ids], scores.tolist()))
+
+    def profile_seeds(self, liked, disliked=None):
+        """Row positions and weights of a taste profile
+
+        ``liked`` and ``disliked`` are lists of titles, or dicts mapping
+        titles to weights (default 1); disliked titles count negatively.
+        Raises KeyError for unknown titles and ValueError without a liked one.
+        """
+        seeds = {}
+        for titles, sign in ((liked, 1.0), (disliked or (), -1.0)):
+            weights = titles if isinstance(titles, dict) else dict.fromkeys(titles, 1.0)
+            for title, weight in weights.items():
+                seeds[title] = seeds.get(title, 0.0) + sign * float(weight)
+        if not any(weight > 0 for weight in seeds.values()):
+            raise ValueError("A taste profile needs at least one liked title with a positive weight")
+        titles = list(seeds)
+        return self.resolve(titles), np.array([seeds[title] for title in titles])
+
+    def profile_neighbors(self, indices, weights, k=5, allowed=None):
+        """Top-k rows for a weighted taste profile in one vectorized query, seeds excluded
+
+        Scores are the weighted sum of the seeds' similarities divided by
+        the total liked weight, so a single seed scores like ``neighbors``.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        ids, scores = (self.filter_model or self.model).profile(indices, weights, k, allowed=allowed)
+        return ids, (scores / weights[weights > 0].sum()).astype(np.float32)
+
+    def profile(self, liked, disliked=None, k=5, **filters):
+        """Top-k (title, score) pairs for several liked and disliked titles, e.g. a watchlist
+
+        ``recommend``'s filters apply too. The seeds are never returned.
+        """
+        indices, weights = self.profile_seeds(liked, disliked)
+        ids, scores = self.profile_neighbors(indices, weights, k, allowed=self.allowed(**filters))
+        return list(zip(self.titles[ids], scores.tolist()))
+
+    def recommend_many(self, titles, k=5):
+        """Top-k neighbor ids and scores for many seed titles in one vectorized call
+
+        Returns two ``(len(titles), k)`` arrays; the seed itself is never
+        among its own neighbors. Rows with fewer than k neighbors (e.g. from
+        the ivf model) are padded with id -1, whose scores mean nothing; keep
+        ``ids >= 0`` before indexing the catalog.
+        """
+        return self.neighbors_many(self.resolve(list(titles)), k)
@@ -0,0 +1,163 @@
+"""Bulk export of the recommendations of the whole catalog
+
+Ranks every title (or the titles listed in a file, one per line) in
+vectorized blocks and streams one row per recommendation to CSV, JSON
+lines or Parquet. Only one block is held in memory at a time, so memory
+stays flat whatever the catalog size. The file is written next to its
+destination and moved into place when complete, so readers never see a
+partial dump.
+
+Usage:
+    python export.py recommendations.csv --k 10
+    python export.py recommendations.parquet --k 20 --model sparse
+    python export.py recommendations.jsonl --titles titles.txt
+"""
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from engine import Recommender
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.environ.get("RECOMMENDER_DATA_DIR", "data")
+FORMATS = ('csv', 'jsonl', 'parquet')
+# Seed titles ranked per vectorized call
+BLOCK_SIZE = 4096
+
+
+def read_titles(path):
+    """Titles listed one per line, blank lines skipped"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def seed_blocks(recommender, titles=None, block_size=BLOCK_SIZE):
+    """Row positions of the seeds, ``block_size`` at a time; unknown titles are skipped"""
+    if titles is None:
+        for start in range(0, len(recommender), block_size):
+            yield np.arange(start, min(start + block_size, len(recommender)))
+        return
+    known = [title for title in titles if title in recommender.title_index]
+    if len(known) < len(titles):
+        logger.warning("Skipping %d unknown titles", len(titles) - len(known))
+    for start in range(0, len(known), block_size):
+        yield recommender.resolve(known[start:start + block_size])
+
+
+def iter_recommendations(recommender, k=10, titles=None, block_size=BLOCK_SIZE):
+    """Top-k recommendations of every seed, as one column dict of rows per block of seeds
+
+    Rows are (seed, seed_id, rank, title, movie_id, score), ranks
+    starting at 1; the id columns are left out if the catalog has no ids.
+    """
+    ranks = np.arange(1, k + 1, dtype=np.int32)
+    for seeds in seed_blocks(recommender, titles, block_size):
+        ids, scores = recommender.neighbors_many(seeds, k)
+        # Approximate models pad rows with fewer than k neighbors with -1
+        keep = ids.ravel() >= 0
+        seed_rows = np.repeat(seeds, ids.shape[1])[keep]
+        rows = ids.ravel()[keep]
+        block = {'seed': recommender.titles[seed_rows]}
+        if recommender.ids is not None:
+            block['seed_id'] = recommender.ids[seed_rows]
+        block['rank'] = np.tile(ranks[:ids.shape[1]], len(seeds))[keep]
+        block['title'] = recommender.titles[rows]
+        if recommender.ids is not None:
+            block['movie_id'] = recommender.ids[rows]
+        block['score'] = scores.ravel()[keep].astype(np.float32)
+        yield block
+
+
+def write_csv(blocks, f):
+    header = True
+    for block in blocks:
+        pd.DataFrame(block).to_csv(f, header=header, index=False)
+        header = False
+
+
+def write_jsonl(blocks, f):
+    for block in blocks:
+        if len(block['seed']):
+            f.write(pd.DataFrame(block).to_json(orient='records', lines=True).rstrip("\n") + "\n")
+
+
+def write_parquet(blocks, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for block in blocks:
+            table = pa.Table.from_pandas(pd.DataFrame(block), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export(recommender, path, fmt=None, k=10, titles=None, block_size=BLOCK_SIZE):
+    """Stream the recommendations to ``path``; the format defaults to its extension. Returns the row count"""
+    fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; use one of {FORMATS}")
+
+    count = 0
+
+    def counted(blocks):
+        nonlocal count
+        for block in blocks:
+            count += len(block['seed'])
+            yield block
+
+    blocks = counted(iter_recommendations(recommender, k, titles, block_size))
+    tmp = f"{path}.tmp"
+    try:
+        if fmt == 'parquet':
+            write_parquet(blocks, tmp)
+        else:
+            with open(tmp, 'w', encoding='utf-8', newline='') as f:
+                (write_csv if fmt == 'csv' else write_jsonl)(blocks, f)
+        if not os.path.exists(tmp):
+            # No seeds: an empty Parquet file has no schema to write
+            open(tmp, 'w').close()
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="file to write (.csv, .jsonl or .parquet)")
+    parser.add_argument("--format", choices=FORMATS, default=None, help="output format (default: from the extension)")
+    parser.add_argument("--k", type=int, default=10, help="recommendations per title")
+    parser.add_argument("--titles", default=None, help="file listing the titles to export, one per line (default: all)")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--model", default=os.environ.get("RECOMMENDER_MODEL"),
+                        help="model to rank with (default: the first one built)")
+    parser.add_argument("--nprobe", default=os.environ.get("RECOMMENDER_NPROBE"),
+                        help="nprobe override for the ivf model")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE, help="titles ranked per vectorized call")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    recommender = Recommender.load(args.data_dir, args.model, args.nprobe)
+    titles = read_titles(args.titles) if args.titles else None
+    start = time.perf_counter()
+    count = export(recommender, args.output, args.format, k=args.k, titles=titles, block_size=args.block_size)
+    print(f"Wrote {count} recommendations of {len(titles) if titles is not None else len(recommender)} titles "
+          f"from the {type(recommender.model).__name__} model to {args.output} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
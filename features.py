@@ -0,0 +1,216 @@
+"""Featurization pipeline for the TMDB movies and credits CSVs
+
+Reproduces the notebook's ``tags`` column (overview words, genres,
+keywords, top 3 cast members and directors with spaces collapsed) without
+its row-by-row ``ast.literal_eval`` passes:
+
+- the CSVs are read in chunks, so memory stays flat on large dumps
+- the JSON columns are parsed with orjson (when installed) across a
+  process pool
+- parsed columns are cached by a hash of their raw text, so a rebuild
+  only parses rows that changed
+- the CountVectorizer output stays a sparse matrix, stored L2-normalized
+  so it can be served directly by ``engine.SparseSimilarity``
+
+It also extracts the filter columns (genres, year, runtime, rating) of
+``engine.Attributes`` from the movies CSV.
+"""
+import ast
+import hashlib
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+
+from engine import Attributes, SparseSimilarity
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+MAX_FEATURES = 5000
+CHUNK_SIZE = 10000
+TOP_CAST = 3
+
+FEATURE_CACHE_FILE = "feature_cache.pkl"
+
+
+def _parse_json(text):
+    try:
+        return _loads(text)
+    except ValueError:
+        # The notebook accepted Python literals, keep doing so
+        return ast.literal_eval(text)
+
+
+def _collapse(names):
+    return [name.replace(" ", "") for name in names]
+
+
+def parse_movie_columns(values):
+    """Parse the raw genres and keywords JSON of one movie"""
+    genres, keywords = values
+    return (_collapse(item['name'] for item in _parse_json(genres)),
+            _collapse(item['name'] for item in _parse_json(keywords)))
+
+
+def parse_credit_columns(values):
+    """Parse the raw cast and crew JSON of one movie"""
+    cast, crew = values
+    return (_collapse(item['name'] for item in _parse_json(cast)[:TOP_CAST]),
+            _collapse(item['name'] for item in _parse_json(crew) if item['job'] == 'Director'))
+
+
+def content_hash(values):
+    """Stable key for the raw text of a row's JSON columns"""
+    return hashlib.blake2b("\x1f".join(values).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class FeatureCache:
+    """Parsed JSON columns keyed by the hash of their raw text"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                self.entries = pickle.load(f)
+
+    def save(self):
+        if self.path:
+            with open(self.path, 'wb') as f:
+                pickle.dump(self.entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _parse_chunk(chunk, columns, parser, cache, pool):
+    """Parse the JSON columns of one CSV chunk, reusing cached rows"""
+    # Rows with a missing JSON column are dropped later, like the notebook's dropna()
+    complete = chunk[columns].notna().all(axis=1)
+    rows = [tuple(values) for values in chunk.loc[complete, columns].itertuples(index=False)]
+    keys = [content_hash(values) for values in rows]
+
+    todo = {}
+    for key, values in zip(keys, rows):
+        if key not in cache.entries and key not in todo:
+            todo[key] = values
+    cache.hits += len(keys) - len(todo)
+    cache.misses += len(todo)
+
+    if todo:
+        results = pool.map(parser, todo.values(), chunksize=256) if pool else map(parser, todo.values())
+        cache.entries.update(zip(todo.keys(), results))
+
+    parsed = pd.Series(None, index=chunk.index, dtype=object)
+    parsed[complete] = pd.Series([cache.entries[key] for key in keys], index=chunk.index[complete], dtype=object)
+    out = chunk.drop(columns=columns)
+    for position, column in enumerate(columns):
+        out[column] = parsed.map(lambda value: value[position] if value is not None else None)
+    return out
+
+
+def read_parsed_csv(path, keep, columns, parser, cache, pool, chunk_size=CHUNK_SIZE):
+    """Read one TMDB CSV in chunks and parse its JSON columns"""
+    chunks = pd.read_csv(path, usecols=keep + columns, chunksize=chunk_size)
+    return pd.concat([_parse_chunk(chunk, columns, parser, cache, pool) for chunk in chunks],
+                     ignore_index=True)
+
+
+class _no_pool:
+    """Stand-in for a process pool when running with a single worker"""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+def build_tags(movies_csv, credits_csv, cache_path=None, workers=None, chunk_size=CHUNK_SIZE):
+    """Build the movie_id / title / tags frame the app serves from"""
+    cache = FeatureCache(cache_path)
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 else _no_pool() as pool:
+        credits = read_parsed_csv(credits_csv, ['movie_id', 'title'], ['cast', 'crew'],
+                                  parse_credit_columns, cache, pool, chunk_size)
+        movies = read_parsed_csv(movies_csv, ['title', 'overview'], ['genres', 'keywords'],
+                                 parse_movie_columns, cache, pool, chunk_size)
+    cache.save()
+
+    # Same join and column order as the notebook
+    movies = credits.merge(movies, on='title')
+    movies = movies[['movie_id', 'title', 'overview', 'genres', 'keywords', 'cast', 'crew']]
+    movies = movies.dropna().reset_index(drop=True)
+
+    words = movies['overview'].str.split()
+    tags = words + movies['genres'] + movies['keywords'] + movies['cast'] + movies['crew']
+    movies = movies[['movie_id', 'title']].copy()
+    movies['tags'] = tags.str.join(" ")
+    return movies, cache
+
+
+def vectorize(tags, max_features=MAX_FEATURES):
+    """Count tag words the way the notebook does, keeping the result sparse"""
+    cv = CountVectorizer(max_features=max_features, stop_words='english')
+    vectors = cv.fit_transform(tags)
+    return vectors.tocsr(), cv.get_feature_names_out().tolist()
+
+
+def transform(tags, vocabulary):
+    """Count tag words against a frozen vocabulary, for movies added after the build"""
+    cv = CountVectorizer(vocabulary=vocabulary, stop_words='english')
+    return cv.transform(tags).tocsr()
+
+
+def build_attributes(movies_csv, movie_ids, chunk_size=CHUNK_SIZE):
+    """Filter columns for the catalog rows ``movie_ids``, read from a TMDB movies CSV
+
+    The rating is TMDB's vote average (0-10), left unknown for movies
+    without votes. Movies missing from the CSV get unknown values.
+    """
+    columns = ['id', 'genres', 'release_date', 'runtime', 'vote_average', 'vote_count']
+    frames = []
+    for chunk in pd.read_csv(movies_csv, usecols=lambda column: column in columns, chunksize=chunk_size):
+        genres = chunk['genres'].map(lambda text: [item['name'] for item in _parse_json(text)]
+                                     if isinstance(text, str) else [])
+        rating = chunk['vote_average'].astype(float)
+        if 'vote_count' in chunk:
+            rating = rating.where(chunk['vote_count'] > 0)
+        frames.append(pd.DataFrame({
+            'genres': genres.values,
+            'year': pd.to_datetime(chunk['release_date'], errors='coerce').dt.year.values,
+            'runtime': chunk['runtime'].values,
+            'rating': rating.values,
+        }, index=chunk['id'].values))
+    table = pd.concat(frames)
+    table = table[~table.index.duplicated()].reindex(np.asarray(movie_ids))
+
+    genre_names = sorted({name for names in table['genres'].dropna() for name in names})
+    if len(genre_names) > 64:
+        raise ValueError(f"{len(genre_names)} genres do not fit in a 64-bit mask")
+    bits = {name: np.uint64(1 << bit) for bit, name in enumerate(genre_names)}
+    masks = np.array([sum((bits[name] for name in set(names)), np.uint64(0)) if isinstance(names, list) else 0
+                      for names in table['genres']], dtype=np.uint64)
+    return Attributes(masks, table['year'].fillna(0).to_numpy(dtype=np.int16),
+                      table['runtime'].fillna(0).to_numpy(dtype=np.int16),
+                      table['rating'].to_numpy(dtype=np.float32), genre_names)
+
+
+def save_features(data_dir, vectors, vocabulary):
+    """Store the tag vectors L2-normalized, as the sparse model serves them"""
+    model = SparseSimilarity(normalize(vectors, norm='l2').astype(np.float32), vocabulary)
+    model.save(data_dir)
+    return model
+
+
+def load_features(data_dir):
+    model = SparseSimilarity.load(data_dir)
+    return model.vectors, model.vocabulary
@@ -0,0 +1,203 @@
+"""Load generator for the recommendation and metadata paths
+
+Simulates N concurrent users. Each user repeatedly picks a title, asks for
+5 recommendations with their OMDB cards, and pauses for a think time.
+Popular titles are picked more often, following a Zipf law, so the cache
+sees a realistic mix of hits and misses. Users either run the app's code
+path in-process (engine, MetadataService, shared cache) or call a running
+service.py over HTTP.
+
+By default OMDB is replaced by a local omdb_stub server started with the
+given faults, so nothing touches the live API:
+
+    python loadtest.py --users 50 --duration 60 --latency-ms 200 --error-rate 0.02
+    python loadtest.py --url http://127.0.0.1:8000 --users 50   # against service.py
+
+Reports throughput, latency percentiles, errors, cache counters and the
+requests the stub received.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.exceptions import RequestException
+
+import omdb_stub
+from engine import Recommender, load_titles
+from metadata import MetadataService
+from metadata_cache import MetadataCache, MetadataStore
+from omdb import OMDB_BASE_URL, OMDB_MAX_WORKERS, OMDBClient, RateLimiter
+
+DATA_DIR = "data"
+RECOMMENDATIONS = 5
+ZIPF_EXPONENT = 1.1
+
+
+class InProcessTarget:
+    """The app's recommend-and-fetch-cards path, without Streamlit"""
+
+    def __init__(self, data_dir, base_url, rate_limit, cache_db):
+        self.recommender = Recommender.load(data_dir)
+        client = OMDBClient(base_url=base_url, rate_limiter=RateLimiter(rate=rate_limit, burst=max(1, int(rate_limit))))
+        self.executor = ThreadPoolExecutor(max_workers=OMDB_MAX_WORKERS, thread_name_prefix="omdb")
+        self.cache = MetadataCache(store=MetadataStore(cache_db, legacy_file=None))
+        self.metadata = MetadataService(client, self.cache, executor=self.executor)
+
+    @property
+    def titles(self):
+        return self.recommender.titles
+
+    def _card(self, title):
+        try:
+            return self.metadata.card(title)
+        except RequestException:
+            # The app shows an error placeholder; count it as a degraded card
+            return None
+
+    def request(self, title):
+        """Number of cards that could not be fetched"""
+        recommendations = self.recommender.recommend(title, RECOMMENDATIONS)
+        cards = list(self.executor.map(self._card, [movie for movie, _ in recommendations]))
+        return sum(card is None for card in cards)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class HTTPTarget:
+    """A running service.py, asked for recommendations with details"""
+
+    def __init__(self, url, data_dir):
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+        self.session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=256))
+        # Titles to pick from are read locally; the service has the same catalog
+        self._titles, _ = load_titles(data_dir)
+
+    @property
+    def titles(self):
+        return self._titles
+
+    def request(self, title):
+        response = self.session.get(f"{self.url}/recommend", params={'title': title, 'k': RECOMMENDATIONS,
+                                                                      'details': 'true'}, timeout=60)
+        response.raise_for_status()
+        return sum(movie.get('details') is None for movie in response.json()['recommendations'])
+
+    def stats(self):
+        return None
+
+
+def zipf_picker(n, exponent=ZIPF_EXPONENT, seed=0):
+    """Function drawing catalog rows, the first rows of a shuffled order being the most popular"""
+    rng = np.random.default_rng(seed)
+    popularity = rng.permutation(n)
+    weights = 1 / np.arange(1, n + 1) ** exponent
+    cumulative = np.cumsum(weights / weights.sum())
+    lock = threading.Lock()
+
+    def pick():
+        with lock:
+            u = rng.random()
+        return popularity[min(int(np.searchsorted(cumulative, u)), n - 1)]
+
+    return pick
+
+
+def run(target, users=10, duration=30.0, think_ms=500.0, seed=0):
+    pick = zipf_picker(len(target.titles), seed=seed)
+    latencies = []
+    outcomes = {'requests': 0, 'failed_requests': 0, 'degraded_cards': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def user(user_id):
+        rng = random.Random(f"{seed}:{user_id}")
+        while time.monotonic() < deadline:
+            title = target.titles[pick()]
+            start = time.perf_counter()
+            try:
+                degraded = target.request(title)
+                failed = 0
+            except Exception:
+                degraded, failed = 0, 1
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                outcomes['requests'] += 1
+                outcomes['failed_requests'] += failed
+                outcomes['degraded_cards'] += degraded
+            # Exponential think time, like independent users
+            time.sleep(rng.expovariate(1000 / think_ms) if think_ms > 0 else 0)
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=user, args=(i,), name=f"user-{i}") for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    samples = np.asarray(latencies) * 1000 if latencies else np.zeros(1)
+    report = {
+        'users': users,
+        'duration_s': elapsed,
+        'throughput_rps': outcomes['requests'] / elapsed,
+        'latency_ms': {name: float(np.percentile(samples, q)) for name, q in
+                       (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))},
+        **outcomes,
+    }
+    cache_stats = target.stats()
+    if cache_stats is not None:
+        report['cache'] = cache_stats
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--users", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--think-ms", type=float, default=500.0, help="mean pause between a user's requests")
+    parser.add_argument("--url", default=None, help="load a running service.py instead of the in-process path")
+    parser.add_argument("--omdb-url", default=None,
+                        help="OMDB endpoint for the in-process path (default: start a local stub)")
+    parser.add_argument("--rate-limit", type=float, default=1000.0, help="client-side OMDB requests per second")
+    parser.add_argument("--cache-db", default=None, help="SQLite metadata store (default: a fresh temporary file)")
+    parser.add_argument("--output", default=None, help="also write the report to this JSON file")
+    omdb_stub.add_fault_arguments(parser)
+    args = parser.parse_args(argv)
+
+    stub = server = None
+    if args.url:
+        target = HTTPTarget(args.url, args.data_dir)
+    else:
+        omdb_url = args.omdb_url
+        if omdb_url is None:
+            stub = omdb_stub.stub_from_arguments(args)
+            server = omdb_stub.start(stub)
+            omdb_url = server.url
+        elif omdb_url == OMDB_BASE_URL:
+            print("Warning: loading the live OMDB API")
+        cache_db = args.cache_db or os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "omdb_cache.db")
+        target = InProcessTarget(args.data_dir, omdb_url, args.rate_limit, cache_db)
+
+    report = run(target, args.users, args.duration, args.think_ms)
+    if stub is not None:
+        report['omdb_stub'] = stub.stats()
+        server.shutdown()
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
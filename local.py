@@ -3,55 +3,24 @@ import streamlit as st
 import requests
 from requests.exceptions import ConnectTimeout, RequestException
 import time
-import json
-import os
-from datetime import datetime, timedelta
+from metadata_cache import MetadataCache, MetadataStore
 
 # Configuration
 OMDB_API_KEY = "d13737da"  # Your OMDB API key
 OMDB_BASE_URL = "http://www.omdbapi.com/"
 
-# Cache system to reduce API calls
-class PosterCache:
-    def __init__(self, cache_file="omdb_cache.json", cache_duration_days=7):
-        self.cache_file = cache_file
-        self.cache_duration = timedelta(days=cache_duration_days)
-        self.cache = self.load_cache()
-    
-    def load_cache(self):
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
-    
-    def save_cache(self):
-        with open(self.cache_file, 'w') as f:
-            json.dump(self.cache, f, indent=2)
-    
-    def get(self, movie_title):
-        if movie_title in self.cache:
-            cached_data = self.cache[movie_title]
-            # Check if cache is still valid
-            try:
-                cached_time = datetime.fromisoformat(cached_data['timestamp'])
-                if datetime.now() - cached_time < self.cache_duration:
-                    return cached_data['data']
-            except:
-                pass
-        return None
-    
-    def set(self, movie_title, data):
-        self.cache[movie_title] = {
-            'data': data,
-            'timestamp': datetime.now().isoformat()
-        }
-        self.save_cache()
+# Cache system to reduce API calls, created once per process rather than on every rerun
+@st.cache_resource
+def get_poster_cache(cache_file="omdb_cache.db", cache_duration_days=7):
+    """In-memory cache in front of the SQLite store, whose writes are batched in the background
+
+    Payloads are readable from memory as soon as they are set, before the
+    store has committed them. The store imports omdb_cache.json once.
+    """
+    return MetadataCache(cache_duration_days=cache_duration_days, store=MetadataStore(cache_file))
 
 # Initialize cache
-poster_cache = PosterCache()
+poster_cache = get_poster_cache()
 
 def fetch_poster_omdb(movie_title, year=None):
     """Fetch movie poster from OMDB API with caching"""
@@ -374,20 +343,16 @@ with st.sidebar:
     
     # Cache statistics
     st.header("💾 Cache Statistics")
-    if os.path.exists("omdb_cache.json"):
-        try:
-            with open("omdb_cache.json", 'r') as f:
-                cache_data = json.load(f)
-                st.metric("Cached Movies", len(cache_data))
-                
-                if st.button("Clear Cache"):
-                    os.remove("omdb_cache.json")
-                    st.success("Cache cleared!")
-                    st.experimental_rerun()
-        except:
-            st.info("No cache data available")
+    cached_movies = len(poster_cache.store)
+    if cached_movies:
+        st.metric("Cached Movies", cached_movies)
+        
+        if st.button("Clear Cache"):
+            poster_cache.clear()
+            st.success("Cache cleared!")
+            st.experimental_rerun()
     else:
-        st.info("No cache file found")
+        st.info("No cache data available")
     
     st.markdown("---")
     
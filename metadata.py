@@ -0,0 +1,115 @@
+"""Cached OMDB movie lookups, independent of Streamlit
+
+``MetadataService`` puts the shared cache in front of the OMDB client:
+
+- fresh payloads are served from the cache
+- expired payloads of found movies are served immediately while a
+  background refresh fetches a new copy (stale-while-revalidate)
+- "Movie not found" answers and failed lookups are cached too, with
+  shorter TTLs and a growing backoff, so they are not retried on every
+  rerun
+
+Lookups are counted by cache result, and failed refreshes by error type,
+in the metrics registry.
+"""
+import logging
+import time
+
+from requests.exceptions import RequestException
+
+import metrics
+from metadata_cache import error_backoff
+from omdb import QUOTA_ERROR, error_payload, is_failure, movie_details, poster_url
+
+logger = logging.getLogger(__name__)
+
+LOOKUPS = metrics.counter("metadata_lookups_total", "Metadata lookups by cache result (fresh, stale, miss)",
+                          ("result",))
+ERRORS = metrics.counter("metadata_errors_total", "Failed OMDB refreshes by error type", ("type",))
+
+
+def cache_key(movie_title, year=None):
+    return f"{movie_title}_{year}" if year else movie_title
+
+
+def export_cache_metrics(cache):
+    """Report the size and hit counters of ``cache`` as gauges"""
+    for name in ('entries', 'bytes', 'hits', 'misses', 'evictions', 'store_hits', 'stale_hits'):
+        metrics.gauge(f"metadata_cache_{name}", f"Metadata cache {name.replace('_', ' ')}",
+                      callback=lambda name=name: cache.stats()[name])
+
+
+class MetadataService:
+    """OMDB payloads for movie titles through the shared cache"""
+
+    def __init__(self, client, cache, executor=None):
+        self.client = client
+        self.cache = cache
+        # Runs background refreshes; without one, stale entries refresh inline
+        self.executor = executor
+
+    def lookup(self, movie_title, year=None):
+        """OMDB payload for a movie, possibly a cached not-found or error payload
+
+        Raises the request error when a movie with no cached payload cannot
+        be fetched.
+        """
+        key = cache_key(movie_title, year)
+        data, fresh = self.cache.lookup(key)
+        LOOKUPS.inc(result="miss" if data is None else "fresh" if fresh else "stale")
+        if data is None:
+            return self.refresh(movie_title, year)
+        if not fresh:
+            if self.executor is not None:
+                self.executor.submit(self._refresh_quietly, movie_title, year, data)
+            else:
+                self._refresh_quietly(movie_title, year, data)
+        return data
+
+    def card(self, movie_title, year=None):
+        """Poster URL and details of a movie from one lookup"""
+        data = self.lookup(movie_title, year)
+        return poster_url(data), movie_details(data, movie_title)
+
+    def refresh(self, movie_title, year=None, stale=None):
+        """Fetch a movie from OMDB and cache the outcome, whatever it is
+
+        If the fetch fails and a ``stale`` payload is given, the stale payload
+        is kept (and retried after the error backoff) instead of the error.
+        """
+        key = cache_key(movie_title, year)
+        # Consecutive failures lengthen the backoff of the cached error (or
+        # stale copy); successful payloads carry no count
+        previous = self.cache.peek(key)
+        failures = previous.get('Failures', 0) + 1 if previous else 1
+        try:
+            data = self.client.fetch_movie(movie_title, year, timeout=10)
+        except RequestException as e:
+            ERRORS.inc(type=type(e).__name__)
+            self._cache_failure(key, error_payload(str(e), failures), stale)
+            raise
+
+        if is_failure(data):
+            # Quota reached, bad key, ...: back off like a network error
+            ERRORS.inc(type="quota" if data.get('Error') == QUOTA_ERROR else "api_error")
+            data = error_payload(data.get('Error', 'Unknown API error'), failures)
+            self._cache_failure(key, data, stale)
+            return stale or data
+        self.cache.set(key, data)
+        return data
+
+    def _cache_failure(self, key, error, stale):
+        if stale is None:
+            self.cache.set(key, error)
+        else:
+            # Keep serving the stale payload, and wait out the backoff before
+            # trying again instead of refreshing on every rerun
+            failures = error['Failures']
+            self.cache.set(key, {**stale, 'Failures': failures},
+                           stored_at=time.time() - self.cache.ttl + error_backoff(failures))
+
+    def _refresh_quietly(self, movie_title, year, stale):
+        try:
+            self.refresh(movie_title, year, stale)
+        except RequestException as e:
+            logger.warning("Refreshing %s failed (%s); serving the stale copy", movie_title, e)
@@ -0,0 +1,317 @@
+"""Caches for OMDB payloads
+
+``MetadataCache`` is shared by every Streamlit session in the process, so a
+title fetched for one user is a hit for all the others. Entries expire
+after a TTL and the least recently used ones are evicted once the entry or
+byte cap is reached.
+
+``MetadataStore`` persists payloads in SQLite (WAL mode) so they survive
+restarts and are shared by every worker process. Writes are queued and
+committed in batches by a background thread.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CACHE_DURATION_DAYS = 7
+CACHE_MAX_ENTRIES = int(os.environ.get("OMDB_CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.environ.get("OMDB_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_DB_PATH = os.environ.get("OMDB_CACHE_DB", "omdb_cache.db")
+LEGACY_CACHE_FILE = "omdb_cache.json"
+
+# The OMDB fields the app renders, plus the failure count of cached errors;
+# everything else is dropped before caching
+CACHED_FIELDS = ('Title', 'Year', 'imdbRating', 'Plot', 'Genre', 'Director', 'Actors',
+                 'Poster', 'Runtime', 'Awards', 'Response', 'Error', 'Failures')
+
+# Negative caching: titles OMDB does not know are retried after a day,
+# failed lookups after a backoff that doubles with each consecutive failure
+NOT_FOUND_TTL_SECONDS = 24 * 3600
+ERROR_TTL_SECONDS = 60
+ERROR_TTL_MAX_SECONDS = 3600
+
+# Expired payloads are still served (while a refresh runs) for this long
+STALE_MAX_DAYS = 30
+
+# Batching of background writes
+WRITE_BATCH_SIZE = 256
+WRITE_INTERVAL_SECONDS = 1.0
+
+
+def compact_payload(data):
+    """Keep only the fields of an OMDB payload that the app renders"""
+    return {field: data[field] for field in CACHED_FIELDS if field in data}
+
+
+def error_backoff(failures):
+    """Seconds before retrying a lookup that failed ``failures`` times in a row"""
+    return min(ERROR_TTL_SECONDS * 2 ** max(failures - 1, 0), ERROR_TTL_MAX_SECONDS)
+
+
+def payload_ttl(data, ttl):
+    """How long a payload stays fresh: ``ttl`` for found movies, less for misses and errors"""
+    response = data.get('Response')
+    if response == 'True':
+        return ttl
+    if response == 'Error':
+        return error_backoff(data.get('Failures', 1))
+    return NOT_FOUND_TTL_SECONDS
+
+
+def payload_size(data):
+    """Approximate memory footprint of a payload, measured as its JSON length"""
+    return len(json.dumps(data, separators=(',', ':')))
+
+
+class MetadataCache:
+    """Thread-safe LRU cache with a TTL and entry/byte caps
+
+    Found movies stay fresh for the TTL; not-found and error payloads for
+    the shorter times of ``payload_ttl``. ``lookup`` also returns expired
+    entries (flagged stale) for up to ``STALE_MAX_DAYS``, so callers can
+    serve them while refreshing. With a ``store``, misses fall through to
+    it and every set is also written to it.
+    """
+
+    def __init__(self, cache_duration_days=CACHE_DURATION_DAYS, max_entries=CACHE_MAX_ENTRIES,
+                 max_bytes=CACHE_MAX_BYTES, store=None):
+        self.ttl = cache_duration_days * 24 * 3600
+        self.max_stale = STALE_MAX_DAYS * 24 * 3600
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (data, stored_at, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.store_hits = 0
+        self.stale_hits = 0
+        self.store = store
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _freshness(self, data, stored_at):
+        """True if fresh, False if stale but servable, None if too old to use"""
+        age = time.time() - stored_at
+        if age < payload_ttl(data, self.ttl):
+            return True
+        if data.get('Response') == 'True' and age < self.ttl + self.max_stale:
+            return False
+        return None
+
+    def lookup(self, key):
+        """(data, fresh) for a key, or (None, False) on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                fresh = self._freshness(entry[0], entry[1])
+                if fresh is not None:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    self.stale_hits += not fresh
+                    return entry[0], fresh
+
+        if self.store is not None:
+            stored = self.store.get(key)
+            if stored is not None:
+                fresh = self._freshness(*stored)
+                if fresh is not None:
+                    self._put(key, stored[0], stored[1])
+                    with self.lock:
+                        self.store_hits += 1
+                        self.stale_hits += not fresh
+                        self.hits += 1
+                    return stored[0], fresh
+
+        with self.lock:
+            self.misses += 1
+        return None, False
+
+    def get(self, key):
+        """Fresh data for a key, or None"""
+        data, fresh = self.lookup(key)
+        return data if fresh else None
+
+    def peek(self, key):
+        """Data for a key however old it is, without touching the counters or LRU order"""
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None:
+            return entry[0]
+        if self.store is not None:
+            stored = self.store.get(key)
+            if stored is not None:
+                return stored[0]
+        return None
+
+    def set(self, key, data, stored_at=None):
+        data = compact_payload(data)
+        stored_at = stored_at or time.time()
+        self._put(key, data, stored_at)
+        if self.store is not None:
+            self.store.put(key, data, stored_at)
+
+    def _put(self, key, data, stored_at):
+        size = payload_size(data)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self.entries[key] = (data, stored_at, size)
+            self.bytes += size
+            while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'store_hits': self.store_hits,
+                'stale_hits': self.stale_hits,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class MetadataStore:
+    """SQLite-backed persistent store of OMDB payloads
+
+    WAL mode lets every worker process read while one writes. ``put`` only
+    queues the entry; a background thread commits queued entries in
+    batches, so persisting is O(1) per entry instead of rewriting a file.
+    """
+
+    def __init__(self, path=CACHE_DB_PATH, legacy_file=LEGACY_CACHE_FILE):
+        self.path = path
+        self.local = threading.local()
+        self.queue = queue.Queue()
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS metadata "
+                     "(key TEXT PRIMARY KEY, data TEXT NOT NULL, stored_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS imports (source TEXT PRIMARY KEY)")
+        conn.commit()
+        if legacy_file:
+            self.import_json(legacy_file)
+
+        self.writer = threading.Thread(target=self._write_loop, name="metadata-store-writer", daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def _connection(self):
+        # sqlite3 connections must stay on the thread that opened them
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA busy_timeout=30000")
+            self.local.conn = conn
+        return conn
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+
+    def get(self, key):
+        """Stored (data, stored_at) for a key, or None"""
+        row = self._connection().execute(
+            "SELECT data, stored_at FROM metadata WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, key, data, stored_at=None):
+        self.queue.put((key, json.dumps(compact_payload(data), separators=(',', ':')), stored_at or time.time()))
+
+    def _write_loop(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + WRITE_INTERVAL_SECONDS
+            # A flush request (an Event) commits the batch right away
+            while len(batch) < WRITE_BATCH_SIZE and isinstance(batch[-1], tuple):
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except sqlite3.Error:
+                logger.exception("Dropped %d cached payloads that could not be written", len(batch))
+
+    def _write(self, batch):
+        flushes = [item for item in batch if not isinstance(item, tuple)]
+        rows = [item for item in batch if isinstance(item, tuple)]
+        try:
+            if rows:
+                conn = self._connection()
+                with conn:
+                    conn.executemany("INSERT OR REPLACE INTO metadata (key, data, stored_at) VALUES (?, ?, ?)", rows)
+        finally:
+            for done in flushes:
+                done.set()
+
+    def flush(self, timeout=None):
+        """Wait until every queued write is committed"""
+        if not self.writer.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        self.flush(timeout=10)
+
+    def clear(self):
+        self.flush()
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM metadata")
+
+    def import_json(self, path):
+        """One-time import of the legacy omdb_cache.json written by local.py"""
+        conn = self._connection()
+        source = os.path.abspath(path)
+        if not os.path.exists(path) or conn.execute(
+                "SELECT 1 FROM imports WHERE source = ?", (source,)).fetchone():
+            return 0
+        try:
+            with open(path, 'r') as f:
+                legacy = json.load(f)
+        except (OSError, ValueError):
+            return 0
+
+        rows = []
+        for key, entry in legacy.items():
+            try:
+                stored_at = datetime.fromisoformat(entry['timestamp']).timestamp()
+                rows.append((key, json.dumps(compact_payload(entry['data']), separators=(',', ':')), stored_at))
+            except (KeyError, TypeError, ValueError):
+                continue
+        with conn:
+            # Entries already in the store are newer than the legacy file
+            conn.executemany("INSERT OR IGNORE INTO metadata (key, data, stored_at) VALUES (?, ?, ?)", rows)
+            conn.execute("INSERT OR IGNORE INTO imports (source) VALUES (?)", (source,))
+        return len(rows)
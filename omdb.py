@@ -0,0 +1,244 @@
+"""Shared OMDB HTTP client
+
+One pooled ``requests.Session`` per process, with a token-bucket rate
+limiter in front of it, so concurrent lookups reuse connections and the
+request rate stays bounded without fixed sleeps between calls. Movie
+lookups for the same title are coalesced, so simultaneous callers share
+one in-flight request. Every request is counted in the metrics registry
+by outcome, with its latency and today's quota use.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+OMDB_API_KEY = os.environ.get("OMDB_API_KEY", "d13737da")
+OMDB_BASE_URL = os.environ.get("OMDB_BASE_URL", "http://www.omdbapi.com/")
+
+# Requests per second allowed through the limiter, and how many may burst at once
+OMDB_RATE_LIMIT = float(os.environ.get("OMDB_RATE_LIMIT", "10"))
+OMDB_BURST = int(os.environ.get("OMDB_BURST", "5"))
+
+# Concurrent lookups, which is also the size of the connection pool
+OMDB_MAX_WORKERS = int(os.environ.get("OMDB_MAX_WORKERS", "8"))
+
+NO_POSTER_URL = "https://via.placeholder.com/300x450?text=No+Poster+Available"
+NOT_FOUND_POSTER_URL = "https://via.placeholder.com/300x450?text=Movie+Not+Found"
+ERROR_POSTER_URL = "https://via.placeholder.com/300x450?text=Error+Loading+Poster"
+
+# OMDB's Error for titles it does not know; any other Error is a failed lookup
+NOT_FOUND_ERROR = "Movie not found!"
+# OMDB's Error once the API key's daily quota is spent
+QUOTA_ERROR = "Request limit reached!"
+
+REQUESTS = metrics.counter("omdb_requests_total", "OMDB requests by outcome", ("outcome",))
+REQUEST_SECONDS = metrics.histogram("omdb_request_seconds", "OMDB request latency", ("outcome",))
+QUOTA_USED = metrics.gauge("omdb_quota_used", "OMDB requests sent by this process since midnight UTC")
+
+
+def is_failure(data):
+    """True for OMDB answers that say nothing about the movie (bad key, quota reached, ...)"""
+    return data.get('Response') == 'Error' or (
+        data.get('Response') == 'False' and data.get('Error', NOT_FOUND_ERROR) != NOT_FOUND_ERROR)
+
+
+def error_payload(message, failures=1):
+    """Payload recording a failed lookup, so it can be cached with a backoff"""
+    return {'Response': 'Error', 'Error': message, 'Failures': failures}
+
+
+def response_outcome(response):
+    """Metrics label for an OMDB response: ok, not_found, quota, api_error or http_<status>"""
+    try:
+        data = response.json()
+    except ValueError:
+        data = {}
+    error = data.get('Error') if data.get('Response') == 'False' else None
+    if error == QUOTA_ERROR:
+        return "quota"
+    if response.status_code >= 400:
+        return f"http_{response.status_code}"
+    if error is None:
+        return "ok"
+    return "not_found" if error == NOT_FOUND_ERROR else "api_error"
+
+
+class QuotaTracker:
+    """Requests sent since midnight UTC, the window of OMDB's daily quota"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.day = None
+        self.used = 0
+
+    def add(self):
+        day = datetime.now(timezone.utc).date()
+        with self.lock:
+            if day != self.day:
+                self.day, self.used = day, 0
+            self.used += 1
+            return self.used
+
+
+quota = QuotaTracker()
+
+
+def poster_url(data):
+    """Poster URL of an OMDB payload, or a placeholder image"""
+    if is_failure(data):
+        return ERROR_POSTER_URL
+    if data.get('Response') != 'True':
+        return NOT_FOUND_POSTER_URL
+    poster = data.get('Poster', 'N/A')
+    if poster and poster != 'N/A':
+        return poster
+    return NO_POSTER_URL
+
+
+def movie_details(data, movie_title):
+    """Fields of an OMDB payload shown by the app, or None if the movie was not found"""
+    if data.get('Response') != 'True':
+        return None
+    return {
+        'title': data.get('Title', movie_title),
+        'year': data.get('Year', 'N/A'),
+        'rating': data.get('imdbRating', 'N/A'),
+        'plot': data.get('Plot', 'No plot available'),
+        'genre': data.get('Genre', 'N/A'),
+        'director': data.get('Director', 'N/A'),
+        'actors': data.get('Actors', 'N/A'),
+        'poster': data.get('Poster', 'N/A'),
+        'runtime': data.get('Runtime', 'N/A'),
+        'awards': data.get('Awards', 'N/A')
+    }
+
+
+class RateLimiter:
+    """Thread-safe token bucket
+
+    Tokens refill at ``rate`` per second up to ``burst``; each request takes
+    one, waiting only as long as needed for the next token.
+    """
+
+    def __init__(self, rate=OMDB_RATE_LIMIT, burst=OMDB_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time
+
+    Threads asking for a key that is already being fetched wait for that
+    call and get its result (or its exception) instead of issuing their own.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = {'done': threading.Event()}
+
+        if not leader:
+            call['done'].wait()
+        else:
+            try:
+                call['result'] = fn()
+            except Exception as e:
+                call['error'] = e
+            finally:
+                with self.lock:
+                    del self.calls[key]
+                call['done'].set()
+
+        if 'error' in call:
+            raise call['error']
+        return call['result']
+
+
+class OMDBClient:
+    """Pooled, rate-limited access to the OMDB API"""
+
+    def __init__(self, api_key=OMDB_API_KEY, base_url=OMDB_BASE_URL, max_connections=OMDB_MAX_WORKERS,
+                 rate_limiter=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.flights = SingleFlight()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, params, timeout=10):
+        """Send one OMDB query; the API key is added to ``params``"""
+        self.rate_limiter.acquire()
+        QUOTA_USED.set(quota.add())
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = self.session.get(self.base_url, params={'apikey': self.api_key, **params}, timeout=timeout)
+            outcome = response_outcome(response)
+            return response
+        except requests.Timeout:
+            outcome = "timeout"
+            raise
+        except requests.ConnectionError:
+            outcome = "connection_error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUESTS.inc(outcome=outcome)
+            REQUEST_SECONDS.observe(elapsed, outcome=outcome)
+            metrics.log_event("omdb_request", duration_ms=round(elapsed * 1000, 3), outcome=outcome,
+                              title=params.get('t'))
+
+    def fetch_movie(self, movie_title, year=None, timeout=10):
+        """Full OMDB payload for a title, including a short plot
+
+        One response carries both the poster and the details. Concurrent
+        calls for the same title share a single request.
+        """
+        params = {'t': movie_title, 'type': 'movie', 'plot': 'short'}
+        if year:
+            params['y'] = year
+
+        def fetch():
+            response = self.get(params, timeout=timeout)
+            if response.status_code == 401:
+                # Quota reached and bad keys come as 401 with an OMDB error
+                # body; return it so callers see which error it is
+                try:
+                    data = response.json()
+                except ValueError:
+                    data = None
+                if isinstance(data, dict) and data.get('Error'):
+                    return data
+            response.raise_for_status()
+            return response.json()
+
+        return self.flights.do((movie_title, year), fetch)
@@ -0,0 +1,183 @@
+"""Local OMDB-compatible stub server with fault injection
+
+Answers OMDB title queries (``?t=...``) from the payloads in
+omdb_cache.json, and makes up plausible payloads for any other title, so
+load tests never touch the live API. Latency, server errors, hung
+requests and daily-quota exhaustion can be injected:
+
+    python omdb_stub.py --port 8765 --latency-ms 150 --error-rate 0.05 --timeout-rate 0.01 --quota 1000
+    OMDB_BASE_URL=http://127.0.0.1:8765/ streamlit run app.py
+
+``GET /__stats`` returns the request counters as JSON.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from omdb import NOT_FOUND_ERROR, QUOTA_ERROR
+
+SEED_FILE = "omdb_cache.json"
+
+
+def load_seed(path=SEED_FILE):
+    """Payloads keyed by case-folded title, from a legacy omdb_cache.json"""
+    try:
+        with open(path, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    payloads = {}
+    for key, entry in cache.items():
+        data = entry.get('data', {}) if isinstance(entry, dict) else {}
+        if data.get('Response') == 'True':
+            payloads[data.get('Title', key).casefold()] = data
+    return payloads
+
+
+def synthetic_payload(title, rng):
+    return {
+        'Title': title, 'Year': str(rng.randint(1950, 2024)), 'Runtime': f"{rng.randint(80, 180)} min",
+        'Genre': rng.choice(["Drama", "Comedy", "Action, Adventure", "Horror", "Animation, Family"]),
+        'Director': "Stub Director", 'Actors': "Stub Actor, Another Actor",
+        'Plot': f"A synthetic plot for {title}.", 'Awards': "N/A", 'Poster': "N/A",
+        'imdbRating': f"{rng.uniform(3, 9):.1f}", 'Type': 'movie', 'Response': 'True',
+    }
+
+
+class OMDBStub:
+    """Request handling and counters shared by every connection of one server"""
+
+    def __init__(self, payloads=None, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, timeout_rate=0.0,
+                 hang_seconds=30.0, quota=None, not_found_rate=0.0, synthesize=True, seed=0):
+        self.payloads = payloads if payloads is not None else load_seed()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.quota = quota
+        self.not_found_rate = not_found_rate
+        self.synthesize = synthesize
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'found': 0, 'not_found': 0, 'errors': 0, 'timeouts': 0, 'over_quota': 0}
+
+    def _count(self, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def answer(self, params):
+        """(HTTP status, JSON body) for one query, after the injected delay"""
+        with self.lock:
+            self.counts['requests'] += 1
+            over_quota = self.quota is not None and self.counts['requests'] > self.quota
+            roll = self.rng.random()
+            delay = max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+        if over_quota:
+            self._count('over_quota')
+            return 401, {'Response': 'False', 'Error': QUOTA_ERROR}
+        if roll < self.timeout_rate:
+            # Longer than any client timeout; the client gives up first
+            self._count('timeouts')
+            time.sleep(self.hang_seconds)
+            return 504, {'Response': 'False', 'Error': "Timed out"}
+        time.sleep(delay)
+        if roll < self.timeout_rate + self.error_rate:
+            self._count('errors')
+            return 500, {'Response': 'False', 'Error': "Internal server error"}
+
+        title = params.get('t', [""])[0]
+        data = self.payloads.get(title.casefold())
+        if data is None and self.synthesize and roll >= self.timeout_rate + self.error_rate + self.not_found_rate:
+            # Seeded per title, so repeated queries get the same answer
+            data = synthetic_payload(title, random.Random(f"{self.seed}:{title}"))
+        if data is None:
+            self._count('not_found')
+            return 200, {'Response': 'False', 'Error': NOT_FOUND_ERROR}
+        self._count('found')
+        return 200, data
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/__stats":
+                status, body = 200, stub.stats()
+            else:
+                status, body = stub.answer(parse_qs(url.query))
+            payload = json.dumps(body).encode('utf-8')
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client timed out and hung up
+                pass
+
+    return Handler
+
+
+def start(stub, host="127.0.0.1", port=0):
+    """Serve ``stub`` on a background thread; returns the server (its URL is ``server.url``)"""
+    server = ThreadingHTTPServer((host, port), make_handler(stub))
+    server.daemon_threads = True
+    server.url = f"http://{host}:{server.server_address[1]}/"
+    threading.Thread(target=server.serve_forever, name="omdb-stub", daemon=True).start()
+    return server
+
+
+def add_fault_arguments(parser):
+    parser.add_argument("--seed-file", default=SEED_FILE, help="omdb_cache.json whose payloads are served")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="mean response delay")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="uniform jitter around the delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="share of requests that hang")
+    parser.add_argument("--hang-seconds", type=float, default=30.0, help="how long hung requests hang")
+    parser.add_argument("--quota", type=int, default=None, help="requests served before 'Request limit reached!'")
+    parser.add_argument("--not-found-rate", type=float, default=0.0,
+                        help="share of unknown titles answered 'Movie not found!'")
+    parser.add_argument("--no-synthesize", action="store_true", help="answer unknown titles with 'Movie not found!'")
+
+
+def stub_from_arguments(args):
+    return OMDBStub(load_seed(args.seed_file), latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                    error_rate=args.error_rate, timeout_rate=args.timeout_rate, hang_seconds=args.hang_seconds,
+                    quota=args.quota, not_found_rate=args.not_found_rate, synthesize=not args.no_synthesize)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_fault_arguments(parser)
+    args = parser.parse_args(argv)
+
+    stub = stub_from_arguments(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(stub))
+    server.daemon_threads = True
+    print(f"OMDB stub serving {len(stub.payloads)} seeded payloads on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(stub.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Local cache of resized poster thumbnails
+
+Posters are downloaded once, shrunk to card size with Pillow and stored as
+JPEG files named by a digest of the downloaded image, so the app serves a
+few KB of local bytes per card instead of sending every browser to the
+upstream image host. The same image behind several URLs is stored once.
+A small index maps each URL to its image and is re-checked after
+``POSTER_URL_TTL_DAYS``, so an image replaced at the same URL is picked
+up. Placeholder images (via.placeholder.com URLs) are drawn locally and
+never downloaded. The directory is bounded by total size; the least
+recently used thumbnails are evicted first.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from PIL import Image, ImageDraw, ImageOps
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+POSTER_CACHE_DIR = os.environ.get("POSTER_CACHE_DIR", "poster_cache")
+POSTER_CACHE_MAX_BYTES = int(os.environ.get("POSTER_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# A URL is downloaded again after this long, in case its image changed
+POSTER_URL_TTL_DAYS = float(os.environ.get("POSTER_URL_TTL_DAYS", "7"))
+# Subdirectory of the URL -> image digest index
+INDEX_DIR = "urls"
+
+# Card-sized thumbnails, twice the width a recommendation column is shown at
+THUMBNAIL_SIZE = (300, 450)
+JPEG_QUALITY = 85
+
+PLACEHOLDER_HOST = "via.placeholder.com"
+# Eviction frees this share of the cap at once, so it does not run on every write
+EVICTION_SLACK = 0.1
+
+
+def placeholder_text(url):
+    """Caption of a via.placeholder.com URL, or None for any other URL"""
+    parsed = urlparse(url)
+    if parsed.netloc != PLACEHOLDER_HOST:
+        return None
+    return parse_qs(parsed.query).get('text', [""])[0]
+
+
+def render_placeholder(text, size=THUMBNAIL_SIZE):
+    """Grey card with a caption, drawn locally instead of fetched"""
+    image = Image.new('RGB', size, (204, 204, 204))
+    draw = ImageDraw.Draw(image)
+    lines = text.split() or [""]
+    line_height = 14
+    top = (size[1] - line_height * len(lines)) // 2
+    for position, line in enumerate(lines):
+        width = draw.textlength(line)
+        draw.text(((size[0] - width) / 2, top + position * line_height), line, fill=(85, 85, 85))
+    return image
+
+
+def make_thumbnail(data, size=THUMBNAIL_SIZE):
+    """JPEG bytes of an image shrunk to fit ``size``, keeping its aspect ratio"""
+    image = data if isinstance(data, Image.Image) else Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    image.thumbnail(size, Image.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+class PosterStore:
+    """Thread-safe, size-bounded directory of poster thumbnails"""
+
+    def __init__(self, directory=POSTER_CACHE_DIR, max_bytes=POSTER_CACHE_MAX_BYTES, size=THUMBNAIL_SIZE,
+                 max_connections=8, url_ttl_days=POSTER_URL_TTL_DAYS):
+        self.directory = directory
+        self.index_dir = os.path.join(directory, INDEX_DIR)
+        self.max_bytes = max_bytes
+        self.size = size
+        self.url_ttl = url_ttl_days * 24 * 3600
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.index_dir, exist_ok=True)
+        self.bytes = sum(entry.stat().st_size for entry in self._entries())
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith('.jpg')]
+
+    def __len__(self):
+        return len(self._entries())
+
+    def digest(self, content):
+        """Name of the thumbnail of some image bytes at this store's size"""
+        return hashlib.blake2b(content + f"|{self.size[0]}x{self.size[1]}".encode('utf-8'),
+                               digest_size=16).hexdigest()
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest + '.jpg')
+
+    def _index_path(self, url):
+        return os.path.join(self.index_dir, hashlib.blake2b(url.encode('utf-8'), digest_size=16).hexdigest())
+
+    def _indexed(self, url):
+        """Digest of the image last downloaded from a URL, or None if unknown or due for a refresh"""
+        index_path = self._index_path(url)
+        try:
+            if time.time() - os.path.getmtime(index_path) > self.url_ttl:
+                return None
+            with open(index_path, 'r') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _read(self, digest):
+        try:
+            with open(self.path(digest), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            # The modification time doubles as the LRU clock
+            os.utime(self.path(digest))
+        except OSError:
+            pass
+        return data
+
+    def thumbnail(self, url, timeout=10):
+        """Thumbnail bytes for a poster URL, downloading and resizing it on first use
+
+        Returns None if the poster cannot be downloaded or decoded.
+        """
+        digest = self._indexed(url)
+        data = self._read(digest) if digest is not None else None
+        if data is not None:
+            with self.lock:
+                self.hits += 1
+            return data
+
+        with self.lock:
+            self.misses += 1
+        text = placeholder_text(url)
+        try:
+            if text is not None:
+                content = f"placeholder|{text}".encode('utf-8')
+            else:
+                response = self.session.get(url, timeout=timeout)
+                response.raise_for_status()
+                content = response.content
+            digest = self.digest(content)
+            # Another URL, or this one before a refresh, may have brought the same image
+            data = self._read(digest)
+            if data is None:
+                image = render_placeholder(text, self.size) if text is not None else content
+                data = make_thumbnail(image, self.size)
+                self._write(self.path(digest), data)
+        except (requests.RequestException, OSError, Image.DecompressionBombError) as e:
+            logger.warning("Could not cache poster %s: %s", url, e)
+            return None
+        self._write_index(url, digest)
+        return data
+
+    def _write(self, path, data):
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        with self.lock:
+            self.bytes += len(data)
+            if self.bytes > self.max_bytes:
+                self._evict()
+
+    def _write_index(self, url, digest):
+        index_path = self._index_path(url)
+        temp_path = f"{index_path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write(digest)
+        os.replace(temp_path, index_path)
+
+    def _evict(self):
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        self.bytes = sum(size for _, size, _ in entries)
+        target = self.max_bytes * (1 - EVICTION_SLACK)
+        for _, size, path in entries:
+            if self.bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.bytes -= size
+            self.evictions += 1
+        self._prune_index()
+
+    def _prune_index(self):
+        """Drop the URLs whose thumbnail was evicted"""
+        for entry in os.scandir(self.index_dir):
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                with open(entry.path, 'r') as f:
+                    digest = f.read().strip()
+                if not os.path.exists(self.path(digest)):
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self.lock:
+            for entry in self._entries() + list(os.scandir(self.index_dir)):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
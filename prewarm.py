@@ -0,0 +1,209 @@
+"""Background prewarm of the OMDB metadata cache for the whole catalog
+
+Walks the catalog in priority order, most recommended titles first
+(by how often a title appears in the other movies' top-k lists), and
+fetches the ones that are missing or expired in the shared SQLite store.
+OMDB requests are capped by a daily budget; progress is checkpointed so
+the next run resumes where the previous one stopped, and once the whole
+catalog is warm the walk starts over to refresh expiring entries.
+
+Usage:
+    python prewarm.py --budget 1000
+    python prewarm.py --budget 1000 --forever
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from requests.exceptions import RequestException
+
+from engine import load_model, load_titles, open_array, save_array
+from metadata import MetadataService, cache_key
+from metadata_cache import MetadataCache, MetadataStore
+from omdb import OMDB_MAX_WORKERS, OMDBClient, is_failure
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = "data"
+CHECKPOINT_FILE = "prewarm.json"
+ORDER_FILE = "prewarm_order.npy"
+
+# The OMDB free tier allows 1,000 requests a day; leave room for the app
+DAILY_BUDGET = 800
+# Top-k lists counted when ranking titles; the app shows 5 recommendations
+PRIORITY_K = 5
+# Titles fetched between checkpoints
+BATCH_SIZE = 50
+# Consecutive failed lookups (quota reached, OMDB down) that end the run
+MAX_FAILURES = 10
+
+
+def title_priority(model, k=PRIORITY_K, block_size=4096):
+    """Rows ordered by how often they appear in other rows' top-k lists, most first"""
+    n = len(model)
+    counts = np.zeros(n, dtype=np.int64)
+    for start in range(0, n, block_size):
+        ids, _ = model.neighbors_many(np.arange(start, min(start + block_size, n)), k)
+        ids = ids[ids >= 0]
+        counts += np.bincount(ids, minlength=n)
+    # Ties keep catalog order
+    return np.lexsort((np.arange(n), -counts)).astype(np.int32)
+
+
+def load_order(data_dir, n_titles, model_kind=None, k=PRIORITY_K, rebuild=False):
+    """Cached priority order of the catalog, recomputed when the catalog changes"""
+    path = os.path.join(data_dir, ORDER_FILE)
+    if not rebuild and os.path.exists(path):
+        order = open_array(path)
+        if len(order) == n_titles:
+            return order
+
+    model = load_model(data_dir, model_kind)
+    if model is None or len(model) != n_titles:
+        logger.warning("No model matching the catalog in %s; prewarming in catalog order", data_dir)
+        order = np.arange(n_titles, dtype=np.int32)
+    else:
+        start = time.perf_counter()
+        order = title_priority(model, k)
+        logger.info("Ranked %d titles in %.1fs", n_titles, time.perf_counter() - start)
+    save_array(path, order)
+    return order
+
+
+def today():
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+class Checkpoint:
+    """Position in the priority order and requests spent today, kept in a JSON file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.position = 0
+        self.passes = 0
+        self.day = today()
+        self.requests = 0
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                state = json.load(f)
+            self.position = state.get('position', 0)
+            self.passes = state.get('passes', 0)
+            if state.get('day') == self.day:
+                self.requests = state.get('requests', 0)
+
+    def remaining(self, budget):
+        """Requests left in today's budget"""
+        if self.day != today():
+            self.day = today()
+            self.requests = 0
+        return max(budget - self.requests, 0)
+
+    def save(self):
+        state = {'position': self.position, 'passes': self.passes, 'day': self.day, 'requests': self.requests}
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.path)
+
+
+def _fetch(service, title):
+    """True if OMDB answered about the movie, found or not"""
+    try:
+        data = service.refresh(title)
+    except RequestException as e:
+        logger.warning("Fetching %s failed: %s", title, e)
+        return False
+    return not is_failure(data)
+
+
+def prewarm(titles, order, service, checkpoint, budget=DAILY_BUDGET, workers=OMDB_MAX_WORKERS):
+    """Fetch missing or expired titles in priority order until today's budget is spent
+
+    Returns the number of OMDB requests made.
+    """
+    cache = service.cache
+    made = 0
+    failures = 0
+    # Titles checked since the last one that needed fetching
+    skipped = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prewarm") as executor:
+        while failures < MAX_FAILURES:
+            remaining = checkpoint.remaining(budget)
+            if not remaining:
+                break
+
+            # Titles already fresh in the store cost nothing and are skipped
+            batch = []
+            while len(batch) < min(BATCH_SIZE, remaining) and skipped < len(order):
+                if checkpoint.position >= len(order):
+                    if batch:
+                        # Fetch the end of this pass before the next one checks the cache
+                        break
+                    checkpoint.position = 0
+                    checkpoint.passes += 1
+                title = titles[order[checkpoint.position]]
+                checkpoint.position += 1
+                if cache.get(cache_key(title)) is None:
+                    batch.append(title)
+                    skipped = 0
+                else:
+                    skipped += 1
+            if not batch:
+                logger.info("Every title is cached and fresh")
+                break
+
+            for ok in executor.map(lambda title: _fetch(service, title), batch):
+                failures = 0 if ok else failures + 1
+            made += len(batch)
+            checkpoint.requests += len(batch)
+            checkpoint.save()
+            logger.info("Fetched %d titles (position %d of %d, %d requests left today)",
+                        made, checkpoint.position, len(order), checkpoint.remaining(budget))
+
+    if failures >= MAX_FAILURES:
+        logger.warning("Stopping after %d failed lookups in a row", failures)
+    cache.store.flush()
+    return made
+
+
+def seconds_until_tomorrow():
+    now = datetime.now(timezone.utc)
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    return (tomorrow - now).total_seconds()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--budget", type=int, default=DAILY_BUDGET, help="OMDB requests allowed per UTC day")
+    parser.add_argument("--checkpoint", default=None, help=f"progress file (default: <data-dir>/{CHECKPOINT_FILE})")
+    parser.add_argument("--model", default=os.environ.get("RECOMMENDER_MODEL"),
+                        help="model used to rank titles (default: the first one built)")
+    parser.add_argument("--k", type=int, default=PRIORITY_K, help="top-k lists counted when ranking titles")
+    parser.add_argument("--workers", type=int, default=OMDB_MAX_WORKERS, help="concurrent OMDB lookups")
+    parser.add_argument("--reorder", action="store_true", help="recompute the priority order")
+    parser.add_argument("--forever", action="store_true", help="keep running, sleeping until the budget resets")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    titles, _ = load_titles(args.data_dir)
+    order = load_order(args.data_dir, len(titles), args.model, args.k, rebuild=args.reorder)
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(args.data_dir, CHECKPOINT_FILE))
+    service = MetadataService(OMDBClient(max_connections=args.workers), MetadataCache(store=MetadataStore()))
+
+    while True:
+        made = prewarm(titles, order, service, checkpoint, args.budget, args.workers)
+        logger.info("Made %d OMDB requests; %d of %d requests used today",
+                    made, checkpoint.requests, args.budget)
+        if not args.forever:
+            break
+        time.sleep(seconds_until_tomorrow() + 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Shared cache of finished recommendation responses
+
+The catalog and model only change with a new build, so the response for a
+movie (ranked movies, scores and their OMDB cards) is the same for every
+user until then. Entries are keyed by ``(catalog row, k, model version)``,
+the row rather than the title so duplicate titles stay apart, and
+filled lazily; when a recommender with a new version is bound, the old
+entries are dropped, so a rebuilt model never serves stale rankings.
+Popular titles then cost one dictionary lookup, with no ranking or OMDB
+work.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+# Responses kept; an app response holds five poster thumbnails (~30 KB each)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+# Cards embed OMDB metadata, so responses expire like the metadata does
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+LOOKUPS = metrics.counter("response_cache_lookups_total", "Recommendation response cache lookups by result",
+                          ("result",))
+
+
+class ResponseCache:
+    """Thread-safe LRU of recommendation responses with a TTL, for one model version at a time"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl=RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def bind(self, version):
+        """Serve responses of model ``version``, dropping every entry of another version"""
+        with self.lock:
+            if version != self.version:
+                if self.entries:
+                    self.invalidations += 1
+                self.entries.clear()
+                self.version = version
+
+    def get(self, seed, k, version, variant=None):
+        """Cached response for catalog row ``seed``, or None
+
+        ``variant`` tells apart responses of the same query (e.g. with details).
+        """
+        key = (seed, k, version, variant)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                LOOKUPS.inc(result="miss")
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        LOOKUPS.inc(result="hit")
+        return entry[1]
+
+    def set(self, seed, k, version, response, variant=None):
+        """Store a response; ignored if ``version`` is not the bound one"""
+        with self.lock:
+            if version != self.version:
+                return
+            key = (seed, k, version, variant)
+            self.entries[key] = (time.time(), response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,205 @@
+"""Headless HTTP recommendation service
+
+Serves the same engine as the Streamlit app, without any Streamlit import:
+
+    uvicorn service:app --workers 4 --port 8000
+
+Every worker memory-maps the model files built by build.py, so all of
+them share one copy of the model in the OS page cache, and OMDB payloads
+are shared through the SQLite metadata store.
+
+Endpoints:
+    GET  /health
+    GET  /search?q=dark+kni&limit=20
+    GET  /recommend?title=Avatar&k=5&details=true
+    GET  /recommend?title=Avatar&genre=Comedy&min_year=2000&min_rating=7
+    POST /recommend/batch  {"titles": ["Avatar", "Titanic"], "k": 5}
+    POST /recommend/profile  {"liked": {"Avatar": 2, "Titanic": 1}, "disliked": ["Cars"], "k": 10}
+    GET  /metrics          Prometheus text format, per worker
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import Response
+from pydantic import BaseModel, Field
+from requests.exceptions import RequestException
+
+import metrics
+from engine import Recommender
+from metadata import MetadataService, export_cache_metrics
+from metadata_cache import MetadataCache, MetadataStore
+from omdb import ERROR_POSTER_URL, OMDB_MAX_WORKERS, OMDBClient
+from responses import ResponseCache
+
+DATA_DIR = os.environ.get("RECOMMENDER_DATA_DIR", "data")
+RECOMMENDER_MODEL = os.environ.get("RECOMMENDER_MODEL")
+RECOMMENDER_NPROBE = os.environ.get("RECOMMENDER_NPROBE")
+
+MAX_K = 100
+MAX_BATCH = 1000
+
+STAGE_SECONDS = metrics.histogram("service_stage_seconds", "Latency of service stages", ("stage", "outcome"))
+
+
+@lru_cache(maxsize=None)
+def get_recommender():
+    """One recommender per worker process, over the shared memory-mapped model"""
+    with metrics.timed(STAGE_SECONDS, stage="load_data"):
+        recommender = Recommender.load(DATA_DIR, RECOMMENDER_MODEL, RECOMMENDER_NPROBE)
+    # Responses cached for a previously loaded model are dropped
+    get_response_cache().bind(recommender.version)
+    return recommender
+
+
+@lru_cache(maxsize=None)
+def get_response_cache():
+    """Finished /recommend responses of this worker, for the loaded model version"""
+    return ResponseCache()
+
+
+@lru_cache(maxsize=None)
+def get_metadata_service():
+    """OMDB lookups through the process-wide cache and the shared SQLite store"""
+    executor = ThreadPoolExecutor(max_workers=OMDB_MAX_WORKERS, thread_name_prefix="omdb")
+    cache = MetadataCache(store=MetadataStore())
+    export_cache_metrics(cache)
+    return MetadataService(OMDBClient(), cache, executor=executor)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Open the model before the first request instead of during it
+    get_recommender()
+    yield
+
+
+app = FastAPI(title="Movie Recommender", lifespan=lifespan)
+
+
+class BatchRequest(BaseModel):
+    titles: list[str] = Field(..., min_length=1, max_length=MAX_BATCH)
+    k: int = Field(5, ge=1, le=MAX_K)
+
+
+class ProfileRequest(BaseModel):
+    # Titles, or titles mapped to weights
+    liked: dict[str, float] | list[str] = Field(..., min_length=1, max_length=MAX_BATCH)
+    disliked: dict[str, float] | list[str] = Field([], max_length=MAX_BATCH)
+    k: int = Field(5, ge=1, le=MAX_K)
+    genres: list[str] | None = None
+    min_year: int | None = None
+    max_year: int | None = None
+    min_runtime: int | None = None
+    max_runtime: int | None = None
+    min_rating: float | None = None
+
+
+def movie_entry(recommender, position, score=None):
+    """JSON fields of one catalog row"""
+    entry = {'title': recommender.titles[position]}
+    if recommender.ids is not None:
+        entry['movie_id'] = recommender.ids[position].item()
+    if score is not None:
+        entry['score'] = float(score)
+    return entry
+
+
+def add_details(entry):
+    """Attach the OMDB poster and details of a movie to its entry"""
+    try:
+        with metrics.timed(STAGE_SECONDS, stage="movie_card"):
+            entry['poster'], entry['details'] = get_metadata_service().card(entry['title'])
+    except RequestException:
+        entry['poster'], entry['details'] = ERROR_POSTER_URL, None
+    return entry
+
+
+def resolve(recommender, titles):
+    try:
+        return recommender.resolve(titles)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
+
+@app.get("/health")
+def health():
+    return {'status': 'ok', 'movies': len(get_recommender())}
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/search")
+def search(q: str = "", limit: int = Query(20, ge=1, le=MAX_K)):
+    recommender = get_recommender()
+    return {'results': [movie_entry(recommender, position) for position in recommender.title_index.search(q, limit)]}
+
+
+@app.get("/recommend")
+def recommend(title: str, k: int = Query(5, ge=1, le=MAX_K), details: bool = False,
+              genre: list[str] = Query(None), min_year: int = None, max_year: int = None,
+              min_runtime: int = None, max_runtime: int = None, min_rating: float = None):
+    recommender = get_recommender()
+    filters = {'genres': genre, 'min_year': min_year, 'max_year': max_year, 'min_runtime': min_runtime,
+               'max_runtime': max_runtime, 'min_rating': min_rating}
+    variant = (details, tuple(genre or ()), min_year, max_year, min_runtime, max_runtime, min_rating)
+    # Keyed on the row, so spellings of the same title share an entry
+    index = int(resolve(recommender, [title])[0])
+    responses = get_response_cache()
+    response = responses.get(index, k, recommender.version, variant)
+    if response is not None:
+        return response
+
+    try:
+        allowed = recommender.allowed(**filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with metrics.timed(STAGE_SECONDS, stage="recommend_rank"):
+        ids, scores = recommender.neighbors(index, k, allowed=allowed)
+    recommendations = [movie_entry(recommender, i, score) for i, score in zip(ids, scores)]
+    if details:
+        # Blocking OMDB lookups, overlapped on the metadata service's threads
+        recommendations = list(get_metadata_service().executor.map(add_details, recommendations))
+    response = {'movie': movie_entry(recommender, index), 'recommendations': recommendations}
+    # Responses with a failed card are retried on the next request
+    if not any(entry.get('poster') == ERROR_POSTER_URL for entry in recommendations):
+        responses.set(index, k, recommender.version, response, variant)
+    return response
+
+
+@app.post("/recommend/batch")
+def recommend_batch(request: BatchRequest):
+    recommender = get_recommender()
+    indices = resolve(recommender, request.titles)
+    with metrics.timed(STAGE_SECONDS, stage="recommend_batch_rank"):
+        ids, scores = recommender.neighbors_many(indices, request.k)
+    return {'results': [
+        {
+            'movie': movie_entry(recommender, index),
+            # The approximate model pads short rows with -1
+            'recommendations': [movie_entry(recommender, i, score) for i, score in zip(row_ids, row_scores) if i >= 0],
+        }
+        for index, row_ids, row_scores in zip(indices, ids, scores)
+    ]}
+
+
+@app.post("/recommend/profile")
+def recommend_profile(request: ProfileRequest):
+    """Recommendations for several liked and disliked titles, scored as one vectorized query"""
+    recommender = get_recommender()
+    filters = request.model_dump(exclude={'liked', 'disliked', 'k'})
+    try:
+        indices, weights = recommender.profile_seeds(request.liked, request.disliked)
+        allowed = recommender.allowed(**filters)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    with metrics.timed(STAGE_SECONDS, stage="recommend_profile_rank"):
+        ids, scores = recommender.profile_neighbors(indices, weights, request.k, allowed=allowed)
+    return {'recommendations': [movie_entry(recommender, i, score) for i, score in zip(ids, scores)]}
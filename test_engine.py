@@ -0,0 +1,155 @@
+"""Ranking checks of engine.py against the notebook's ``sorted(enumerate(...))`` ranking
+
+The synthetic catalogs have few distinct tag counts, so many scores tie,
+and a few movies without any tags, whose scores are all zero.
+"""
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from engine import DenseSimilarity, EmbeddingModel, IVFIndex, NeighborIndex, Recommender, SparseSimilarity, top_k
+
+K = 10
+
+
+def synthetic_vectors(n=200, n_terms=40, empty=(3, 50, 197, 198, 199), seed=0):
+    """L2-normalized sparse tag vectors with ``empty`` rows holding no tags"""
+    rng = np.random.default_rng(seed)
+    # Few distinct counts per row, so many scores tie
+    counts = rng.integers(0, 3, size=(n, n_terms)) * (rng.random((n, n_terms)) < 0.15)
+    counts[list(empty)] = 0
+    return normalize(sparse.csr_matrix(counts.astype(np.float32)), norm='l2').astype(np.float32)
+
+
+def reference_ranking(row, index, k=K):
+    """Top-k of one similarity row the way the notebook ranks them"""
+    distances = sorted(list(enumerate(row)), reverse=True, key=lambda x: x[1])
+    return [i for i, _ in distances if i != index][:k]
+
+
+def similarity_row(vectors, index):
+    return vectors @ vectors[index].toarray().astype(np.float32)[0]
+
+
+def assert_same_ranking(exact, model, indices, k=K):
+    """Same top-k scores as ``exact``, each id scoring what it scores in the exact model"""
+    for index in indices:
+        exact_ids, exact_scores = exact.neighbors(index, k)
+        ids, scores = model.neighbors(index, k)
+        np.testing.assert_allclose(scores, exact_scores, atol=1e-6)
+        full = (exact.vectors @ exact.vectors[index].T).toarray().ravel()
+        np.testing.assert_allclose(full[ids], scores, atol=1e-6)
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    return synthetic_vectors()
+
+
+def exact_models(vectors):
+    return {
+        'dense': DenseSimilarity(np.asarray((vectors @ vectors.toarray().T).T, dtype=np.float32)),
+        'neighbors': NeighborIndex.from_features(vectors, k=K),
+        'sparse': SparseSimilarity(vectors),
+        # Probing every list scores every movie
+        'ivf': IVFIndex.build(vectors, nlist=8, nprobe=8),
+    }
+
+
+def test_top_k_breaks_ties_like_sorted_enumerate():
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, 4, size=(50, 30)).astype(np.float32)
+    exclude = rng.integers(0, 30, size=50)
+    for k in (1, 5, 29, 40):
+        ids, scores = top_k(rows, k, exclude=exclude)
+        for row, seed, found, found_scores in zip(rows, exclude, ids, scores):
+            expected = reference_ranking(row, seed, k)
+            assert found.tolist() == expected
+            np.testing.assert_array_equal(found_scores, row[expected])
+
+
+def test_top_k_returns_fewer_columns_than_allowed():
+    row = np.array([0.5, 0.9, 0.9, 0.1, 0.7], dtype=np.float32)
+    allowed = np.array([True, True, False, False, True])
+    ids, scores = top_k(row, 5, exclude=[1], allowed=allowed)
+    assert ids[0].tolist() == [4, 0]
+    np.testing.assert_array_equal(scores[0], row[[4, 0]])
+
+
+@pytest.mark.parametrize("kind", ['dense', 'neighbors', 'sparse', 'ivf'])
+def test_exact_models_match_the_notebook_ranking(vectors, kind):
+    model = exact_models(vectors)[kind]
+    ids, scores = model.neighbors_many(np.arange(len(model)), K)
+    for index in range(len(model)):
+        row = similarity_row(vectors, index)
+        expected = reference_ranking(row, index)
+        assert ids[index].tolist() == expected
+        np.testing.assert_allclose(scores[index], row[expected], atol=1e-6)
+        single_ids, single_scores = model.neighbors(index, K)
+        assert single_ids.tolist() == expected
+        np.testing.assert_array_equal(single_scores, scores[index])
+
+
+@pytest.mark.parametrize("kind", ['dense', 'sparse', 'ivf'])
+def test_filtered_queries_rank_only_allowed_movies(vectors, kind):
+    model = exact_models(vectors)[kind]
+    allowed = np.random.default_rng(1).random(len(model)) < 0.3
+    for index in (0, 3, 100):
+        row = similarity_row(vectors, index)
+        row[~allowed] = -np.inf
+        ids, _ = model.neighbors(index, K, allowed=allowed)
+        candidates = np.count_nonzero(allowed) - allowed[index]
+        assert ids.tolist() == reference_ranking(row, index)[:candidates]
+
+
+def test_ivf_scores_rows_without_tags_at_the_end_of_a_list():
+    vectors = sparse.csr_matrix(np.array([[1, 0, 0], [0, 1, 0], [0, 0.6, 0.8], [0, 0, 0]], dtype=np.float32))
+    index = IVFIndex(vectors, np.ones((1, 3), dtype=np.float32), np.arange(4, dtype=np.int32), np.array([0, 4]), 1)
+    np.testing.assert_allclose(index._score_list(0, np.array([0, 0, 1], dtype=np.float32)), [0, 0, 0.8, 0])
+
+
+@pytest.mark.parametrize("nlist", [1, 8])
+def test_ivf_probing_every_list_matches_the_sparse_model(vectors, nlist):
+    index = IVFIndex.build(vectors, nlist=nlist, nprobe=nlist)
+    assert_same_ranking(SparseSimilarity(vectors), index, range(len(index)))
+
+
+def test_ivf_add_keeps_rows_without_tags_scored():
+    vectors = synthetic_vectors(seed=1)
+    # Movies with no known tags are assigned to list 0, after its other movies
+    index = IVFIndex.build(vectors[:150], nlist=8, nprobe=8).add(vectors[150:])
+    assert_same_ranking(SparseSimilarity(vectors), index, range(len(index)))
+
+
+def test_ivf_pads_rows_with_fewer_candidates_than_k(vectors):
+    index = IVFIndex.build(vectors, nlist=40, nprobe=1)
+    ids, scores = index.neighbors_many(np.arange(len(index)), K)
+    for row in range(len(index)):
+        found_ids, found_scores = index.neighbors(row, K)
+        assert ids[row, :len(found_ids)].tolist() == found_ids.tolist()
+        np.testing.assert_array_equal(scores[row, :len(found_ids)], found_scores)
+        assert (ids[row, len(found_ids):] == -1).all()
+
+
+def test_neighbor_index_add_matches_a_rebuild(vectors):
+    added = NeighborIndex.from_features(vectors[:150], k=K).add(vectors)
+    rebuilt = NeighborIndex.from_features(vectors, k=K)
+    np.testing.assert_array_equal(added.ids, rebuilt.ids)
+    np.testing.assert_array_equal(added.scores, rebuilt.scores)
+
+
+def test_embedding_ranks_by_its_own_scores(vectors):
+    model = EmbeddingModel.build(vectors, dims=16)
+    ids, scores = model.neighbors_many(np.arange(len(model)), K)
+    for index in (0, 3, 100, 199):
+        row = model.embedding @ model.embedding[index]
+        assert ids[index].tolist() == reference_ranking(row, index)
+        # One matrix-vector product and a block product may round differently
+        _, single_scores = model.neighbors(index, K)
+        np.testing.assert_allclose(single_scores, scores[index], atol=1e-6)
+
+
+def test_profile_of_one_seed_ranks_like_its_neighbors(vectors):
+    recommender = Recommender([f"Movie {i}" for i in range(vectors.shape[0])], SparseSimilarity(vectors))
+    assert recommender.profile(["Movie 7"], k=K) == recommender.recommend("Movie 7", K)
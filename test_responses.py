@@ -0,0 +1,44 @@
+"""Version binding, LRU and TTL rules of the shared response cache"""
+from responses import ResponseCache
+
+
+def test_entries_of_another_version_are_never_served():
+    cache = ResponseCache()
+    cache.bind("v1")
+    cache.set(7, 5, "v1", ["a"])
+    assert cache.get(7, 5, "v1") == ["a"]
+    # Writes for a version that is not bound are dropped
+    cache.set(8, 5, "v0", ["stale"])
+    assert cache.get(8, 5, "v0") is None
+    cache.bind("v2")
+    assert len(cache) == 0 and cache.get(7, 5, "v1") is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_variants_and_k_are_separate_entries():
+    cache = ResponseCache()
+    cache.bind("v1")
+    cache.set(7, 5, "v1", ["plain"])
+    cache.set(7, 5, "v1", ["comedies"], variant=(('genres', ('Comedy',)),))
+    assert cache.get(7, 5, "v1") == ["plain"]
+    assert cache.get(7, 5, "v1", variant=(('genres', ('Comedy',)),)) == ["comedies"]
+    assert cache.get(7, 10, "v1") is None
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = ResponseCache(max_entries=2)
+    cache.bind("v1")
+    cache.set(1, 5, "v1", "one")
+    cache.set(2, 5, "v1", "two")
+    cache.get(1, 5, "v1")
+    cache.set(3, 5, "v1", "three")
+    assert cache.get(2, 5, "v1") is None
+    assert cache.get(1, 5, "v1") == "one" and cache.get(3, 5, "v1") == "three"
+
+
+def test_expired_entries_are_misses():
+    cache = ResponseCache(ttl=-1)
+    cache.bind("v1")
+    cache.set(1, 5, "v1", "one")
+    assert cache.get(1, 5, "v1") is None
+    assert len(cache) == 0
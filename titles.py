@@ -0,0 +1,126 @@
+import bisect
+import re
+import threading
+import unicodedata
+
+# Length of the character n-grams used for substring search
+NGRAM = 3
+
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_title(title):
+    """Case-fold a title and strip accents, punctuation and extra spaces"""
+    title = str(title)
+    # Plain ASCII titles have no accents to strip
+    if not title.isascii():
+        title = unicodedata.normalize('NFKD', title)
+        title = ''.join(c for c in title if not unicodedata.combining(c))
+    title = _PUNCTUATION.sub(" ", title.casefold())
+    return " ".join(title.split())
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class TitleIndex:
+    """Title to row lookup and incremental search, built once per catalog
+
+    Exact titles resolve in O(1). Titles that only match after normalization
+    ("the dark knight" for "The Dark Knight") resolve through a second dict.
+    Titles shared by several movies keep every row; lookups return the first
+    one, like ``movies[movies['title'] == title].index[0]``.
+    """
+
+    def __init__(self, titles, ids=None):
+        self.titles = list(titles)
+        self.ids = list(ids) if ids is not None else None
+        self.exact = {}
+        self.normalized = {}
+        for position, title in enumerate(self.titles):
+            self.exact.setdefault(title, []).append(position)
+            self.normalized.setdefault(normalize_title(title), []).append(position)
+
+        # Sorted keys serve prefix queries by bisection
+        self.keys = sorted(self.normalized)
+
+        # Character n-gram postings serve substring queries. They take
+        # seconds on large catalogs, so they are built in the background and
+        # substring queries scan the keys until they are ready
+        self.postings = None
+        threading.Thread(target=self._build_postings, name="title-postings", daemon=True).start()
+
+    def _build_postings(self):
+        postings = {}
+        for key_id, key in enumerate(self.keys):
+            for gram in _ngrams(key):
+                postings.setdefault(gram, []).append(key_id)
+        self.postings = postings
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __contains__(self, title):
+        return title in self.exact or normalize_title(title) in self.normalized
+
+    def positions(self, title):
+        """Every row whose title matches, exact spelling first"""
+        if title in self.exact:
+            return self.exact[title]
+        return self.normalized.get(normalize_title(title), [])
+
+    def lookup(self, title):
+        """Row of a title, raising KeyError if it is not in the catalog"""
+        positions = self.positions(title)
+        if not positions:
+            raise KeyError(title)
+        return positions[0]
+
+    def label(self, position):
+        """Display name of a row, disambiguated when the title is shared"""
+        title = self.titles[position]
+        if len(self.exact[title]) > 1 and self.ids is not None:
+            return f"{title} (#{self.ids[position]})"
+        return title
+
+    def _prefix_keys(self, query, limit):
+        start = bisect.bisect_left(self.keys, query)
+        matches = []
+        for key in self.keys[start:]:
+            if not key.startswith(query) or len(matches) >= limit:
+                break
+            matches.append(key)
+        return matches
+
+    def _substring_keys(self, query):
+        if len(query) < NGRAM:
+            return []
+        if self.postings is None:
+            return [key for key in self.keys if query in key]
+        candidates = None
+        for gram in _ngrams(query):
+            postings = set(self.postings.get(gram, ()))
+            candidates = postings if candidates is None else candidates & postings
+            if not candidates:
+                return []
+        return [self.keys[key_id] for key_id in sorted(candidates) if query in self.keys[key_id]]
+
+    def search(self, query, limit=20):
+        """Up to ``limit`` rows matching ``query``, prefix matches first"""
+        query = normalize_title(query)
+        if not query:
+            return list(range(min(limit, len(self.titles))))
+
+        keys = self._prefix_keys(query, limit)
+        if len(keys) < limit:
+            seen = set(keys)
+            keys += [key for key in self._substring_keys(query) if key not in seen]
+
+        results = []
+        for key in keys:
+            results.extend(self.normalized[key])
+            if len(results) >= limit:
+                break
+        return results[:limit]